@@ -0,0 +1,8 @@
+"""Benchmarks for lingdocs, run on synthetic projects of configurable size.
+
+Generate a project and time the main build steps with::
+
+    python -m benchmarks.run --chapters 50 --examples 40
+
+Results are stored as JSON and can be compared to earlier runs with
+``--compare``, see :mod:`benchmarks.run`."""
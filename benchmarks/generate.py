@@ -0,0 +1,329 @@
+"""Synthetic lingdocs projects for benchmarks.
+All content is generated from a seed, so projects of the same size and seed
+are identical across runs and lingdocs versions."""
+import logging
+import random
+from pathlib import Path
+
+import yaml
+from pycldf import Generic
+
+log = logging.getLogger(__name__)
+
+SYLLABLES = ["ka", "to", "ri", "pa", "me", "sü", "no", "wa", "je", "ɨ", "ma", "ku"]
+GLOSSES = ["PST", "3SG", "1PL", "ACC", "NMLZ", "NEG", "COP", "DIST", "PL", "ERG"]
+WORDS = "the of a grammar verb noun clause marker form is in and with".split()
+
+SOURCE = """@book{bench2024,
+    author = {Doe, Jane},
+    title = {A synthetic grammar},
+    publisher = {Benchmark Press},
+    year = {2024}
+}
+"""
+
+CONFIG = {
+    "paths": {"cldf": "cldf/metadata.json"},
+    "output": {"build": ["plain", "html", "latex", "mkdocs", "github"]},
+}
+
+METADATA = {
+    "id": "lingdocs-benchmark",
+    "version": "0.0.1",
+    "title": "A synthetic grammar",
+    "authors": [{"family-names": "Doe", "given-names": "Jane"}],
+    "abstract": "A generated project for timing lingdocs.",
+    "license": "CC-BY-4.0",
+    "type": "book",
+}
+
+
+def _column(name, property_url=None, separator=None, required=False):
+    column = {"name": name, "datatype": "string", "required": required}
+    if property_url:
+        column["propertyUrl"] = f"http://cldf.clld.org/v1.0/terms.rdf#{property_url}"
+    if separator:
+        column["separator"] = separator
+    return column
+
+
+def _add_tables(ds):
+    ds.add_component("LanguageTable")
+    ds.add_component("ExampleTable")
+    ds.add_table(
+        "morphemes.csv",
+        _column("ID", "id", required=True),
+        _column("Language_ID", "languageReference", required=True),
+        _column("Name", "name"),
+        _column("Description", "description"),
+        _column("Parameter_ID", separator="; "),
+        _column("Comment", "comment"),
+        _column("Source", "source", separator=";"),
+        _column("Part_Of_Speech", "partOfSpeech"),
+    )
+    ds.add_table(
+        "morphs.csv",
+        _column("ID", "id", required=True),
+        _column("Language_ID", "languageReference", required=True),
+        _column("Name", "name"),
+        _column("Description", "description"),
+        _column("Segments", "segments", separator=" "),
+        _column("Morpheme_ID"),
+        _column("Parameter_ID", separator="; "),
+        _column("Comment", "comment"),
+        _column("Source", "source", separator=";"),
+        _column("Part_Of_Speech", "partOfSpeech"),
+    )
+    ds.add_table(
+        "wordforms.csv",
+        _column("ID", "id", required=True),
+        _column("Language_ID", "languageReference", required=True),
+        _column("Form", "form", required=True),
+        _column("Description", "description"),
+        _column("Part_Of_Speech", "partOfSpeech"),
+        _column("Parameter_ID", separator="; "),
+        _column("Morpho_Segments", separator=" "),
+        _column("Stem_ID"),
+        _column("Segments", "segments", separator=" "),
+        _column("Comment", "comment"),
+        _column("Source", "source", separator=";"),
+    )
+    ds.add_table(
+        "texts.csv",
+        _column("ID", "id", required=True),
+        _column("Name", "name"),
+        _column("Description", "description"),
+        _column("Comment", "comment"),
+        _column("Source", "source", separator=";"),
+        _column("Type"),
+        _column("Metadata"),
+    )
+    ds.add_columns("ExampleTable", "Text_ID", "Record_Number")
+    for table in ["morphemes.csv", "morphs.csv", "wordforms.csv"]:
+        ds.add_foreign_key(table, "Language_ID", "languages.csv", "ID")
+    ds.add_foreign_key("morphs.csv", "Morpheme_ID", "morphemes.csv", "ID")
+    ds.add_foreign_key("ExampleTable", "Text_ID", "texts.csv", "ID")
+
+
+class ProjectGenerator:
+    """Generates the chapters, tables, manual examples and CLDF dataset of a
+    synthetic project.
+
+    Args:
+        chapters (int): The number of chapters.
+        examples (int): The number of examples per chapter.
+        tables (int): The number of tables.
+        manual_examples (int): The number of manual examples.
+        crossrefs (int): The number of cross-references per chapter.
+        languages (int): The number of languages.
+        morphemes (int): The number of morphemes per language.
+        seed (int): The seed for the random content.
+    """
+
+    def __init__(
+        self,
+        chapters=10,
+        examples=20,
+        tables=5,
+        manual_examples=5,
+        crossrefs=5,
+        languages=5,
+        morphemes=50,
+        seed=1,
+    ):  # pylint: disable=too-many-arguments
+        self.chapters = chapters
+        self.examples = examples
+        self.tables = tables
+        self.manual_examples = manual_examples
+        self.crossrefs = crossrefs
+        self.languages = languages
+        self.morphemes = morphemes
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    def parameters(self):
+        return {
+            k: getattr(self, k)
+            for k in [
+                "chapters",
+                "examples",
+                "tables",
+                "manual_examples",
+                "crossrefs",
+                "languages",
+                "morphemes",
+                "seed",
+            ]
+        }
+
+    def word(self, syllables=None):
+        return "".join(
+            self.random.choices(SYLLABLES, k=syllables or self.random.randint(1, 3))
+        )
+
+    def sentence(self, length=10):
+        return " ".join(self.random.choices(WORDS, k=length)).capitalize() + "."
+
+    def data(self):
+        """The rows of the CLDF tables."""
+        data = {
+            "LanguageTable": [],
+            "morphemes.csv": [],
+            "morphs.csv": [],
+            "wordforms.csv": [],
+            "ExampleTable": [],
+            "texts.csv": [],
+        }
+        for lg in range(self.languages):
+            lg_id = f"lg{lg}"
+            data["LanguageTable"].append(
+                {
+                    "ID": lg_id,
+                    "Name": f"{self.word(2).capitalize()} {lg}",
+                    "Latitude": self.random.uniform(-10, 10),
+                    "Longitude": self.random.uniform(-70, -50),
+                }
+            )
+            for m in range(self.morphemes):
+                gloss = self.random.choice(GLOSSES).lower() + str(m)
+                name = self.word()
+                data["morphemes.csv"].append(
+                    {
+                        "ID": f"{lg_id}-m{m}",
+                        "Language_ID": lg_id,
+                        "Name": name,
+                        "Description": gloss,
+                        "Parameter_ID": [gloss],
+                    }
+                )
+                data["morphs.csv"].append(
+                    {
+                        "ID": f"{lg_id}-m{m}-1",
+                        "Language_ID": lg_id,
+                        "Name": name,
+                        "Description": gloss,
+                        "Morpheme_ID": f"{lg_id}-m{m}",
+                        "Parameter_ID": [gloss],
+                    }
+                )
+                suffix = self.random.choice(SYLLABLES)
+                data["wordforms.csv"].append(
+                    {
+                        "ID": f"{lg_id}-w{m}",
+                        "Language_ID": lg_id,
+                        "Form": name + suffix,
+                        "Description": gloss,
+                        "Parameter_ID": [gloss],
+                        "Morpho_Segments": [name, suffix],
+                    }
+                )
+        for chapter in range(self.chapters):
+            text_id = f"text{chapter}"
+            data["texts.csv"].append({"ID": text_id, "Name": f"Text {chapter}"})
+            for ex in range(self.examples):
+                words = [
+                    (self.word(), self.random.choice(GLOSSES))
+                    for _ in range(self.random.randint(3, 8))
+                ]
+                data["ExampleTable"].append(
+                    {
+                        "ID": f"ex{chapter}-{ex}",
+                        "Language_ID": f"lg{self.random.randrange(self.languages)}",
+                        "Primary_Text": " ".join(w for w, _ in words),
+                        "Analyzed_Word": [w + "-" + w[:2] for w, _ in words],
+                        "Gloss": [f"word-{g}" for _, g in words],
+                        "Translated_Text": self.sentence(len(words)),
+                        "Source": ["bench2024[12]"],
+                        "Text_ID": text_id,
+                        "Record_Number": str(ex + 1),
+                    }
+                )
+        return data
+
+    def chapter(self, number):
+        """The markdown of a chapter."""
+        lines = [f"# Chapter {number} [label](ch{number})", ""]
+        for ex in range(self.examples):
+            if ex % 5 == 0:
+                section = ex // 5
+                lines.extend(
+                    [f"## Section {section} [label](ch{number}-s{section})", ""]
+                )
+            lg = self.random.randrange(self.languages)
+            morpheme = self.random.randrange(self.morphemes)
+            lines.extend(
+                [
+                    f"{self.sentence()} The [lg](lg{lg}) morph [m](lg{lg}-m{morpheme}-1)"
+                    f" of [mp](lg{lg}-m{morpheme}) occurs in [wf](lg{lg}-w{morpheme}), see [exref](ex{number}-{ex})"
+                    f" and [psrc](bench2024[{ex + 1}]).",
+                    "",
+                    f"[ex](ex{number}-{ex})",
+                    "",
+                ]
+            )
+        for _ in range(self.crossrefs):
+            target = self.random.randrange(self.chapters)
+            section = self.random.randrange(max(1, (self.examples + 4) // 5))
+            lines.extend([f"{self.sentence(6)} See [ref](ch{target}-s{section}).", ""])
+        for table in range(number, self.tables, self.chapters):
+            lines.extend([f"[table](table{table})", ""])
+        for manex in range(number, self.manual_examples, self.chapters):
+            lines.extend([f"[manex](manex{manex})", ""])
+        return "\n".join(lines)
+
+    def table(self, rows=10, columns=4):
+        header = ",".join(f"Column {i}" for i in range(columns))
+        return "\n".join(
+            [header]
+            + [
+                ",".join(f"*{self.word()}*" for _ in range(columns))
+                for _ in range(rows)
+            ]
+        )
+
+    def write(self, path):
+        """Write the project to path, which is created if necessary.
+
+        Returns:
+            Path: The project folder.
+        """
+        path = Path(path)
+        for folder in ["docs", "tables", "manual_examples", "cldf"]:
+            (path / folder).mkdir(parents=True, exist_ok=True)
+        with open(path / "config.yaml", "w", encoding="utf-8") as f:
+            yaml.dump(CONFIG, f)
+        with open(path / "metadata.yaml", "w", encoding="utf-8") as f:
+            yaml.dump(METADATA, f)
+        structure = {}
+        for number in range(self.chapters):
+            structure[f"chapter{number}"] = {}
+            (path / "docs" / f"chapter{number}.md").write_text(
+                self.chapter(number), encoding="utf-8"
+            )
+        with open(path / "docs" / "structure.yaml", "w", encoding="utf-8") as f:
+            yaml.dump(structure, f)
+        table_metadata = {}
+        for number in range(self.tables):
+            table_metadata[f"table{number}"] = {"caption": f"Table {number}"}
+            (path / "tables" / f"table{number}.csv").write_text(
+                self.table(), encoding="utf-8"
+            )
+        with open(path / "tables" / "metadata.yaml", "w", encoding="utf-8") as f:
+            yaml.dump(table_metadata, f)
+        for number in range(self.manual_examples):
+            (path / "manual_examples" / f"manex{number}.md").write_text(
+                "\n".join(f"{i}. {self.word()} '{self.sentence(3)}'" for i in range(4)),
+                encoding="utf-8",
+            )
+        ds = Generic.in_dir(path / "cldf")
+        _add_tables(ds)
+        ds.add_sources(SOURCE)
+        ds.write(path / "cldf" / "metadata.json", **self.data())
+        log.info(f"Generated benchmark project in {path}: {self.parameters()}")
+        return path
+
+
+def generate_project(path, **kwargs):
+    """Write a synthetic project to path; see :class:`ProjectGenerator` for the
+    available settings."""
+    return ProjectGenerator(**kwargs).write(path)
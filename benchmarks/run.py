@@ -0,0 +1,233 @@
+"""Times the main build steps on a synthetic project.
+
+Every step is run ``--repeat`` times with a fresh output folder and the build
+cache turned off. The timings are written to a JSON file, by default
+``benchmarks/results/<lingdocs version>.json``; passing an earlier result
+file to ``--compare`` prints the change for every step and exits with status 1
+if a step got slower than ``--threshold`` allows::
+
+    python -m benchmarks.run --chapters 50 --compare benchmarks/results/0.1.4.json
+"""
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import click
+
+from benchmarks.generate import ProjectGenerator
+from lingdocs.cache import LINGDOCS_VERSION
+from lingdocs.cldf import create_cldf
+from lingdocs.config import CONTENT_FOLDER, STRUCTURE_FILE, config
+from lingdocs.helpers import load_cldf_dataset, load_content
+from lingdocs.output import check_ids, create_output
+from lingdocs.profiling import profiler
+
+log = logging.getLogger(__name__)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+FORMATS = ["plain", "html", "latex", "mkdocs", "github"]
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _load(project):
+    contents = load_content(
+        source_dir=project / CONTENT_FOLDER,
+        structure_file=project / CONTENT_FOLDER / STRUCTURE_FILE,
+    )
+    ds = load_cldf_dataset(config["source"] / config["paths"]["cldf"])
+    return contents, ds
+
+
+def _run_steps(project, metadata, timings, formats, repeat):
+    def record(name, seconds):
+        timings.setdefault(name, []).append(seconds)
+
+    for _ in range(repeat):
+        record(
+            "import lingdocs.cli",
+            _timed(
+                lambda: subprocess.run(
+                    [sys.executable, "-c", "import lingdocs.cli"], check=True
+                )
+            ),
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            config.load_from_dir(project)
+            config["paths"]["output"] = output_dir
+            config["output"]["cache"] = False
+            config["data"]["data"] = False
+            start = time.perf_counter()
+            contents, ds = _load(project)
+            record("load", time.perf_counter() - start)
+            for output_format in formats or FORMATS:
+                record(
+                    f"create_output {output_format}",
+                    _timed(
+                        lambda: create_output(
+                            contents,
+                            project,
+                            [output_format],  # pylint: disable=cell-var-from-loop
+                            ds,
+                            output_dir,
+                            metadata=metadata,
+                        )
+                    ),
+                )
+            record("check_ids", _timed(lambda: check_ids(contents, ds, project)))
+            # detail pages are only written as part of a build
+            config["data"]["data"] = True
+            profiler.reset()
+            create_output(contents, project, ["mkdocs"], ds, output_dir, metadata)
+            record(
+                "write_details", profiler.stages[("mkdocs", "write_details")]["wall"]
+            )
+            profiler.reset(enabled=False)
+            config["data"]["data"] = False
+            record(
+                "create_cldf",
+                _timed(
+                    lambda: create_cldf(
+                        contents, ds, project, output_dir, metadata_file=metadata
+                    )
+                ),
+            )
+
+
+def run_benchmarks(project, formats=None, repeat=3):
+    """Time the CLI startup, create_output per format, check_ids, write_details
+    and create_cldf.
+
+    Args:
+        project (Path): The project folder.
+        formats (list): The formats passed to create_output.
+        repeat (int): How often every step is run.
+
+    Returns:
+        dict: The wall times in seconds of every run, by step.
+    """
+    project = Path(project).resolve()
+    metadata = project / "metadata.yaml"
+    timings = {}
+    cwd = os.getcwd()
+    # like the command line interface, run in the project folder
+    os.chdir(project)
+    try:
+        _run_steps(project, metadata, timings, formats, repeat)
+    finally:
+        os.chdir(cwd)
+    return timings
+
+
+def summarize(timings):
+    return {
+        name: {
+            "median": statistics.median(runs),
+            "min": min(runs),
+            "runs": runs,
+        }
+        for name, runs in timings.items()
+    }
+
+
+def compare(old, new, threshold=1.1):
+    """Compare the median times of two results.
+
+    Returns:
+        list: Tuples of step, old median, new median, ratio and whether the
+        step is slower than ``threshold`` times the old median.
+    """
+    rows = []
+    for name, values in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before, after = old["results"][name]["median"], values["median"]
+        ratio = after / before if before else float("inf")
+        rows.append((name, before, after, ratio, ratio > threshold))
+    return rows
+
+
+@click.command()
+@click.option("--chapters", default=10, show_default=True)
+@click.option("--examples", default=20, show_default=True, help="Per chapter.")
+@click.option("--tables", default=5, show_default=True)
+@click.option("--manual-examples", default=5, show_default=True)
+@click.option("--crossrefs", default=5, show_default=True, help="Per chapter.")
+@click.option("--languages", default=5, show_default=True)
+@click.option("--morphemes", default=50, show_default=True, help="Per language.")
+@click.option("--seed", default=1, show_default=True)
+@click.option("--repeat", default=3, show_default=True)
+@click.option("--formats", multiple=True, help="Formats to build (default: all).")
+@click.option(
+    "--project",
+    type=click.Path(path_type=Path),
+    help="Keep the generated project in this folder.",
+)
+@click.option(
+    "--output",
+    type=click.Path(path_type=Path),
+    help="Result file (default: benchmarks/results/<version>.json).",
+)
+@click.option(
+    "--compare",
+    "previous",
+    type=click.Path(exists=True, path_type=Path),
+    help="Earlier result file to compare with.",
+)
+@click.option("--threshold", default=1.1, show_default=True)
+def main(
+    project, output, previous, threshold, formats, repeat, **parameters
+):  # pylint: disable=too-many-arguments
+    """Generate a synthetic project and time lingdocs on it."""
+    logging.getLogger("lingdocs").setLevel(logging.WARNING)
+    generator = ProjectGenerator(**parameters)
+    with tempfile.TemporaryDirectory() as tmp:
+        project = generator.write(project or Path(tmp) / "project").resolve()
+        timings = run_benchmarks(project, formats=list(formats), repeat=repeat)
+    result = {
+        "lingdocs": LINGDOCS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "parameters": generator.parameters(),
+        "results": summarize(timings),
+    }
+    output = output or RESULTS_DIR / f"{LINGDOCS_VERSION}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4)
+    for name, values in result["results"].items():
+        click.echo(f"{name:<22} {values['median']:8.3f}s (min {values['min']:.3f}s)")
+    click.echo(f"Wrote {output}")
+    if previous:
+        with open(previous, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        if old["parameters"] != result["parameters"]:
+            log.warning(f"{previous} was run with different parameters")
+        slower = False
+        click.echo(f"\nCompared to {previous} (lingdocs {old['lingdocs']}):")
+        for name, before, after, ratio, regression in compare(old, result, threshold):
+            flag = "  SLOWER" if regression else ""
+            click.echo(
+                f"{name:<22} {before:8.3f}s -> {after:8.3f}s  x{ratio:.2f}{flag}"
+            )
+            slower = slower or regression
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
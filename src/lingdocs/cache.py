@@ -0,0 +1,216 @@
+"""Content-addressed cache for incremental builds"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from lingdocs.config import (
+    EXTRA_DIR,
+    FIGURE_DIR,
+    MANEX_DIR,
+    PLD_DIR,
+    TABLE_DIR,
+)
+
+log = logging.getLogger(__name__)
+
+try:
+    LINGDOCS_VERSION = version("lingdocs")
+except PackageNotFoundError:  # pragma: no cover
+    LINGDOCS_VERSION = "unknown"
+
+
+def fingerprint(*parts):
+    """Hashes an arbitrary number of strings, bytes, paths or JSON-serializable objects."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        elif isinstance(part, str):
+            digest.update(part.encode("utf-8"))
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _hash_files(paths, base=None):
+    digest = hashlib.sha256()
+    for path in sorted(set(paths)):
+        path = Path(path)
+        if not path.is_file():
+            continue
+        name = path.relative_to(base) if base else path.name
+        digest.update(str(name).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _iter_files(path):
+    path = Path(path)
+    if path.is_file():
+        yield path
+    elif path.is_dir():
+        for file in path.rglob("*"):
+            if file.is_file():
+                yield file
+
+
+def dataset_fingerprint(dataset):
+    """Hash of the metadata, the table files and the sources of a CLDF dataset."""
+    files = [dataset.tablegroup._fname]
+    for table in dataset.tables:
+        files.append(Path(str(table.url.resolve(table.base))))
+    if dataset.bibpath:
+        files.append(dataset.bibpath)
+    return _hash_files(files)
+
+
+def source_fingerprint(source_dir):
+    """Hash of everything in the project folder that influences a build,
+    apart from the content files themselves: tables, figure and manual example
+    metadata, extra files, custom templates, metadata and configuration."""
+    source_dir = Path(source_dir)
+    files = []
+    for sub in [
+        TABLE_DIR,
+        FIGURE_DIR + "/metadata.yaml",
+        MANEX_DIR,
+        EXTRA_DIR,
+        PLD_DIR,
+        "metadata.yaml",
+        "config.yaml",
+    ]:
+        files.extend(_iter_files(source_dir / sub))
+    return _hash_files(files, base=source_dir)
+
+
+class BuildCache:
+    """A persistent key-value store in the output folder.
+    Entries are JSON files named after the hash of everything that went into
+    producing them, grouped by output format.
+    Entries which were not used during a build are removed by :meth:`prune`."""
+
+    def __init__(self, path, enabled=True):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, scope, key):
+        return self.path / scope / f"{key}.json"
+
+    def get(self, scope, key):
+        if not self.enabled:
+            return None
+        path = self._file(scope, key)
+        if not path.is_file():
+            self.misses += 1
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            log.debug(f"Discarding unreadable cache entry {path}")
+            self.misses += 1
+            return None
+        self.used.add(path)
+        self.hits += 1
+        return value
+
+    def set(self, scope, key, value):
+        if not self.enabled:
+            return
+        path = self._file(scope, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        self.used.add(path)
+
+    def memoize(self, scope, key, func):
+        """Returns the cached value for key, or computes and stores it."""
+        value = self.get(scope, key)
+        if value is None:
+            value = func()
+            self.set(scope, key, value)
+        return value
+
+    def prune(self, scope):
+        """Removes all entries of a scope that were not used since this cache was opened."""
+        if not self.enabled or not (self.path / scope).is_dir():
+            return
+        for path in (self.path / scope).iterdir():
+            if path not in self.used:
+                path.unlink()
+
+    def clear(self):
+        if self.path.is_dir():
+            shutil.rmtree(self.path)
+
+
+class TableSnapshot:
+    """Replaces :meth:`csvw.Table.iterdicts` for a table.
+    The parsed rows are pickled to ``path`` the first time they are read and
+    unpickled from there afterwards, also in later runs. Nothing is kept in
+    memory between reads."""
+
+    def __init__(self, table, path):
+        self.table = table
+        self.path = Path(path)
+
+    def _parse(self, **kwargs):
+        return type(self.table).iterdicts(self.table, **kwargs)
+
+    def _rows(self):
+        try:
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            pass
+        log.debug(f"Creating snapshot of {self.table.url}")
+        rows = list(self._parse())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        prefix = self.path.name.split("-")[0]
+        for stale in self.path.parent.glob(f"{prefix}-*.pickle"):
+            if stale != self.path:
+                stale.unlink(missing_ok=True)
+        temp = self.path.with_suffix(f".{os.getpid()}")
+        with open(temp, "wb") as f:
+            pickle.dump(rows, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, self.path)
+        return rows
+
+    def __call__(
+        self, log=None, with_metadata=False, fname=None, _Row=OrderedDict, strict=True
+    ):  # pylint: disable=too-many-arguments,redefined-outer-name
+        if log or with_metadata or fname or _Row is not OrderedDict or not strict:
+            return self._parse(
+                log=log,
+                with_metadata=with_metadata,
+                fname=fname,
+                _Row=_Row,
+                strict=strict,
+            )
+        return iter(self._rows())
+
+
+def snapshot_dataset(dataset, path):
+    """Makes the tables of a CLDF dataset read their rows from snapshots in ``path``.
+    Snapshots are keyed by the table metadata and the hash of the table file."""
+    for table in dataset.tables:
+        file = Path(str(table.url.resolve(table.base)))
+        if not file.is_file():
+            continue
+        key = fingerprint(
+            LINGDOCS_VERSION, table.asdict(), _hash_files([file]), str(file.name)
+        )
+        name = file.name.replace("-", "_")
+        table.iterdicts = TableSnapshot(table, Path(path) / f"{name}-{key}.pickle")
@@ -10,16 +10,16 @@ from pycldf.dataset import SchemaError
 from slugify import slugify
 from writio import load
 
-from lingdocs.config import DATA_DIR, EXTRA_DIR, config
+from lingdocs.config import CACHE_DIR, DATA_DIR, EXTRA_DIR, config
+from lingdocs.document import Document
 from lingdocs.formats import CLLD
 from lingdocs.helpers import (
-    check_abbrevs,
     get_sections,
     get_topics,
-    load_figure_metadata,
     read_file,
     table_metadata,
 )
+from lingdocs.index import dataset_index
 from lingdocs.models import models
 from lingdocs.postprocessing import postprocess
 from lingdocs.preprocessing import preprocess, render_markdown
@@ -76,12 +76,13 @@ def get_chapters(output_dir):
 def create_cldf(
     chapter_dic, ds, source_dir, output_dir, metadata_file, add_documents=None, **kwargs
 ):
-    content = "\n\n".join([x["content"] for x in chapter_dic.values()])
-    check_abbrevs(ds, source_dir, content)
+    document = Document(
+        chapter_dic, source_dir, ds, cache_dir=Path(output_dir) / CACHE_DIR
+    )
     metadata_dict = load(metadata_file)
     clld = CLLD()
-    clld.figure_metadata = load_figure_metadata(source_dir)
-    preprocessed = preprocess(content, source_dir)
+    clld.figure_metadata = document.figure_metadata
+    preprocessed = preprocess(document.content, source_dir, document=document)
     preprocessed = clld.preprocess_commands(preprocessed, **kwargs)
     preprocessed = render_markdown(
         preprocessed,
@@ -89,7 +90,9 @@ def create_cldf(
         decorate_gloss_string=CLLD.decorate_gloss_string,
         builder=clld,
     )
-    preprocessed = "\n" + postprocess(preprocessed, clld, source_dir)
+    preprocessed = "\n" + postprocess(
+        preprocessed, ds, clld, source_dir, document=document
+    )
     tent = preprocessed.replace(
         "![](", "![](/static/images/"
     )  # rudely assume that all images live in the static dir
@@ -170,7 +173,7 @@ def create_cldf(
                 decorate_gloss_string=CLLD.decorate_gloss_string,
                 builder=clld,
             )
-            lp_tent = "\n" + postprocess(lp_tent, clld, source_dir)
+            lp_tent = "\n" + postprocess(lp_tent, ds, clld, source_dir)
             lp_tent = lp_tent.replace(
                 "![](", "![](/static/images/"
             )  # rudely assume that all images live in the static dir
@@ -224,7 +227,8 @@ def create_cldf(
                     decorate_gloss_string=CLLD.decorate_gloss_string,
                     output_format="clld",
                 ),
-                CLLD,
+                ds,
+                clld,
                 source_dir,
             )
             chapters.append(d)
@@ -278,7 +282,7 @@ def generate_autocomplete(ds, output_dir):
     for model in models:
         menu_data[model.name] = []
         try:
-            for row in ds.iter_rows(model.cldf_table):
+            for row in dataset_index(ds).rows(model.cldf_table):
                 menu_data[model.name].append(
                     {"id": row["ID"], "content": model.autocomplete_string(row)}
                 )
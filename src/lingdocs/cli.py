@@ -4,18 +4,15 @@ import sys
 from pathlib import Path
 
 import click
-from writio import dump, load
-
-from lingdocs.cldf import create_cldf, generate_autocomplete
-from lingdocs.config import CONTENT_FOLDER, STRUCTURE_FILE, config
-from lingdocs.helpers import _get_relative_file, load_cldf_dataset, load_content
-from lingdocs.helpers import new as create_new
-from lingdocs.helpers import write_readme
-from lingdocs.output import check_abbrevs, check_ids, clean_output, create_output
-from lingdocs.output import preview as run_preview
-from lingdocs.output import update_structure as do_update_structure
-from lingdocs.preprocessing import preprocess_cldfviz
-from lingdocs.releasing import run_releases
+import yaml
+
+from lingdocs.config import CACHE_DIR, CONTENT_FOLDER, STRUCTURE_FILE, config
+from lingdocs.external import BudgetExceeded
+from lingdocs.profiling import profiler
+from lingdocs.structure import _get_relative_file
+
+# commands import what they need when they run, so that e.g. `lingdocs --help`
+# does not have to load pandas, pycldf, cldfviz and the output formats
 
 log = logging.getLogger(__name__)
 
@@ -61,7 +58,23 @@ class BuildCommand(OutputCommand):
         )
 
 
-@main.command(cls=BuildCommand)
+class ParallelCommand(BuildCommand):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.params.extend(
+            [
+                click.core.Option(
+                    ("--jobs", "-j"),
+                    default=1,
+                    show_default=True,
+                    type=int,
+                    help="Number of formats to build in parallel (0: one per CPU core).",
+                )
+            ]
+        )
+
+
+@main.command(cls=ParallelCommand)
 @click.option(
     "--targets",
     multiple=True,
@@ -76,38 +89,79 @@ class BuildCommand(OutputCommand):
     help="Compile create output, where applicable.",
     show_default=True,
 )
-def build(source, targets, cldf, output_dir, _compile):
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Time the build stages; writes profile.json to the output folder.",
+    show_default=True,
+)
+def build(
+    source, targets, cldf, output_dir, _compile, jobs, profile
+):  # pylint: disable=too-many-arguments
     """Create formatted output of lingdocs project."""
+    from writio import load
+
+    from lingdocs.cldf import generate_autocomplete
+    from lingdocs.helpers import load_cldf_dataset, load_content, write_readme
+    from lingdocs.output import BuildFailed, create_output
+
     source = Path(source)
     config.load_from_dir(source)
+    profiler.reset(enabled=profile)
     if not cldf:
         cldf = config["source"] / config["paths"]["cldf"]
-    contents = load_content(
-        source_dir=source / CONTENT_FOLDER,
-        structure_file=source / CONTENT_FOLDER / STRUCTURE_FILE,
-    )
-    ds = load_cldf_dataset(cldf, source_dir=source)
+    with profiler.stage("load content"):
+        contents = load_content(
+            source_dir=source / CONTENT_FOLDER,
+            structure_file=source / CONTENT_FOLDER / STRUCTURE_FILE,
+        )
+    with profiler.stage("load dataset"):
+        ds = load_cldf_dataset(
+            cldf, source_dir=source, cache_dir=Path(output_dir) / CACHE_DIR
+        )
     metadata = load(source / "metadata.yaml")
     targets = targets or config["output"]["build"]
     if not isinstance(targets, list) and not isinstance(targets, tuple):
         targets = [targets]
-    create_output(
-        contents, source, targets, ds, output_dir, metadata=metadata, _compile=_compile
-    )
+    try:
+        create_output(
+            contents,
+            source,
+            targets,
+            ds,
+            output_dir,
+            metadata=metadata,
+            jobs=jobs,
+            _compile=_compile,
+        )
+    except (BudgetExceeded, BuildFailed) as e:
+        log.error(e)
+        sys.exit(1)
+    finally:
+        if profile:
+            profiler.write(Path(output_dir) / "profile.json")
+            click.echo(profiler.summary())
     if config["output"]["readme"]:
         write_readme(source / "metadata.yaml")
     if config["input"]["sublime"]:
         generate_autocomplete(ds, source / "docs")
 
 
-@main.command(cls=BuildCommand)
+@main.command(cls=ParallelCommand)
 @click.option("--bump", "-b", default="patch")
-def release(source, cldf, output_dir, **kwargs):
+def release(source, cldf, output_dir, jobs, **kwargs):
+    from writio import load
+
+    from lingdocs.helpers import load_cldf_dataset, load_content
+    from lingdocs.output import BuildFailed, create_output
+    from lingdocs.releasing import run_releases
+
     source = Path(source)
     config.load_from_dir(source)
     if not cldf:
         cldf = config["paths"]["cldf"]
-    ds = load_cldf_dataset(cldf)
+    ds = load_cldf_dataset(cldf, cache_dir=Path(output_dir) / CACHE_DIR)
     contents = load_content(
         source_dir=source / CONTENT_FOLDER,
         structure_file=_get_relative_file(
@@ -115,15 +169,20 @@ def release(source, cldf, output_dir, **kwargs):
         ),
     )
     metadata = load(source / "metadata.yaml")
-    create_output(
-        contents,
-        source,
-        config["output"]["build"],
-        ds,
-        output_dir,
-        metadata=metadata,
-        _compile=True,
-    )
+    try:
+        create_output(
+            contents,
+            source,
+            config["output"]["build"],
+            ds,
+            output_dir,
+            metadata=metadata,
+            jobs=jobs,
+            _compile=True,
+        )
+    except (BudgetExceeded, BuildFailed) as e:
+        log.error(e)
+        sys.exit(1)
     run_releases(source, output_dir, **kwargs)
 
 
@@ -136,11 +195,17 @@ def release(source, cldf, output_dir, **kwargs):
 @click.option(
     "--refresh",
     default=True,
-    help="Re-render preview on file change.",
+    help="Re-render preview on file change; html and mkdocs previews reload in the browser.",
     show_default=True,
 )
 def preview(source, target, cldf, output_dir, refresh):
     """Create a live preview using a lightweight, human-readable output format"""
+    from writio import load
+
+    from lingdocs.formats import builders
+    from lingdocs.helpers import load_cldf_dataset, load_content
+    from lingdocs.output import preview as run_preview
+
     source = Path(source)
     config.load_from_dir(source)
     config["paths"]["output"] = output_dir
@@ -151,10 +216,10 @@ def preview(source, target, cldf, output_dir, refresh):
         source_dir=source / CONTENT_FOLDER,
         structure_file=source / CONTENT_FOLDER / STRUCTURE_FILE,
     )
-    ds = load_cldf_dataset(cldf, source_dir=source)
+    ds = load_cldf_dataset(
+        cldf, source_dir=source, cache_dir=Path(output_dir) / CACHE_DIR
+    )
     metadata = load(source / "metadata.yaml") or {}
-    from lingdocs.formats import builders
-
     run_preview(
         dataset=ds,
         source_dir=source,
@@ -167,19 +232,61 @@ def preview(source, target, cldf, output_dir, refresh):
 
 @main.command(cls=BuildCommand)
 def check(source, cldf, output_dir):
+    """Check the IDs and glossing abbreviations used in the text.
+    Exits with status 1 if there are missing IDs."""
+    from lingdocs.helpers import check_abbrevs, load_cldf_dataset, load_content
+    from lingdocs.output import check_ids
+
     config.load_from_dir(source)
-    del output_dir
     if cldf is None:
         cldf = config["paths"]["cldf"]
-    ds = load_cldf_dataset(cldf)
+    cache_dir = Path(output_dir) / CACHE_DIR
+    ds = load_cldf_dataset(cldf, cache_dir=cache_dir)
     contents = load_content(
         source_dir=source / CONTENT_FOLDER,
         structure_file=_get_relative_file(
             folder=source / CONTENT_FOLDER, file=STRUCTURE_FILE
         ),
     )
-    check_ids(contents, ds, source)
-    check_abbrevs(ds, source, "\n".join([x["content"] for x in contents.values()]))
+    missing = check_ids(contents, ds, source)
+    check_abbrevs(
+        ds,
+        source,
+        "\n".join([x["content"] for x in contents.values()]),
+        cache_dir=cache_dir,
+    )
+    if missing:
+        sys.exit(1)
+
+
+@main.command()
+@click.option(
+    "--targets",
+    multiple=True,
+    default=None,
+    help="List of target output formats (default: all).",
+)
+@click.option(
+    "--explain",
+    is_flag=True,
+    default=False,
+    help="List all candidate files in the order they are tried (*: used, +: exists).",
+)
+def templates(targets, explain):
+    """Show which template files are used for which entities and formats."""
+    from lingdocs.formats import builders
+    from lingdocs.models import models
+    from lingdocs.templates import explain_templates
+
+    config.load_from_dir(".")
+    targets = targets or builders.keys()
+    for line in explain_templates(
+        [builders[target]() for target in targets],
+        models,
+        rich=config["data"]["rich"],
+        explain=explain,
+    ):
+        print(line)
 
 
 @main.command(cls=BuildCommand)
@@ -191,9 +298,13 @@ def check(source, cldf, output_dir):
     type=click.Path(exists=True, path_type=Path),
 )
 def cldf(source, cldf, output_dir, add):
+    from lingdocs.cldf import create_cldf
+    from lingdocs.helpers import load_cldf_dataset, load_content
+    from lingdocs.preprocessing import preprocess_cldfviz
+
     config.load_from_dir(source)
     cldf = cldf or config["source"] / config["paths"]["cldf"]
-    ds = load_cldf_dataset(cldf)
+    ds = load_cldf_dataset(cldf, cache_dir=Path(output_dir) / CACHE_DIR)
     contents = load_content(
         source_dir=source / CONTENT_FOLDER,
         structure_file=_get_relative_file(
@@ -208,7 +319,7 @@ def cldf(source, cldf, output_dir, add):
                 {
                     "ID": add_doc.stem,
                     "Name": add_doc.stem.capitalize(),
-                    "Description": "".join(preprocess_cldfviz(content)),
+                    "Description": preprocess_cldfviz(content),
                 }
             )
     create_cldf(
@@ -223,18 +334,24 @@ def cldf(source, cldf, output_dir, add):
 
 @main.command()
 def update_structure():
+    from lingdocs.structure import update_structure as do_update_structure
+
     do_update_structure()
 
 
 @main.command(cls=OutputCommand)
 def clean(output_dir):  # pragma: no cover
     """Compile the generated LaTeX output"""
+    from lingdocs.output import clean_output
+
     clean_output(output_dir=output_dir)
 
 
 @main.command()
 def new():
     """Create a new lingdocs project."""
+    from lingdocs.helpers import new as create_new
+
     create_new()
 
 
@@ -256,7 +373,8 @@ def author_config():
     conf_path.mkdir(parents=True, exist_ok=True)
     yaml_path = conf_path / "author_config.yaml"
     log.info(f"Saving to {yaml_path}")
-    dump(val_dict, yaml_path)
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        yaml.dump(val_dict, f, allow_unicode=True, sort_keys=False)
 
 
 if __name__ == "__main__":
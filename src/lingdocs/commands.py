@@ -0,0 +1,126 @@
+"""Parsing of lingdocs commands like ``[ex](id)`` or ``[table](label)``.
+Markdown is split into text spans and :class:`Command` tokens once; the
+preprocessing stages replace commands in the token stream and hand it on,
+so the document is not scanned again by every stage."""
+import logging
+from functools import cached_property
+
+from lingdocs.config import MD_LINK_PATTERN
+
+log = logging.getLogger(__name__)
+
+
+class Command(str):
+    """A command in markdown. The string value is the markdown source."""
+
+    def __new__(cls, text, key, url):
+        command = super().__new__(cls, text)
+        command.key = key
+        command.url = url
+        return command
+
+    def __getnewargs__(self):
+        return str(self), self.key, self.url
+
+    @cached_property
+    def arguments(self):
+        """The URL without arguments, positional arguments and keyword arguments,
+        e.g. ``("apa-1", ["nt"], {"with_language": "False"})`` for
+        ``[ex](apa-1?nt&with_language=False)``."""
+        url, args, kwargs = self.url, [], {}
+        if "?" in url:
+            url, arguments = url.split("?", 1)
+            for arg in arguments.split("&"):
+                if "=" in arg:
+                    k, v = arg.split("=", 1)
+                    kwargs[k] = v
+                else:
+                    args.append(arg)
+        return url, args, kwargs
+
+
+class Markdown(str):
+    """Markdown together with its tokens, text spans and :class:`Command` objects."""
+
+    def __new__(cls, tokens):
+        markdown = super().__new__(cls, "".join(tokens))
+        markdown.tokens = tokens
+        return markdown
+
+    def __getnewargs__(self):
+        return (self.tokens,)
+
+
+def tokenize(md):
+    """Splits markdown into text spans and commands."""
+    tokens = []
+    current = 0
+    for m in MD_LINK_PATTERN.finditer(md):
+        if m.start() > current:
+            tokens.append(md[current : m.start()])
+        tokens.append(Command(m.group(0), m.group("label"), m.group("url")))
+        current = m.end()
+    if current < len(md):
+        tokens.append(md[current:])
+    return tokens
+
+
+def parse(md):
+    """A :class:`Markdown` object for md; already parsed markdown is returned as is."""
+    if isinstance(md, Markdown):
+        return md
+    return Markdown(tokenize(md))
+
+
+def join(parts, delimiter=""):
+    """Like ``delimiter.join(parts)``, keeping the tokens of the parts."""
+    tokens = []
+    for i, part in enumerate(parts):
+        if i and delimiter:
+            tokens.append(delimiter)
+        tokens.extend(parse(part).tokens)
+    return Markdown(tokens)
+
+
+def commands(md, key=None):
+    """The commands in md, optionally only those with a given key."""
+    for token in parse(md).tokens:
+        if isinstance(token, Command) and key in [None, token.key]:
+            yield token
+
+
+def locate(md):
+    """The commands in md with their line and column numbers (starting at 1)."""
+    line, column = 1, 1
+    for token in parse(md).tokens:
+        if isinstance(token, Command):
+            yield token, line, column
+        newlines = token.count("\n")
+        if newlines:
+            line += newlines
+            column = len(token) - token.rfind("\n")
+        else:
+            column += len(token)
+
+
+def expand(md, handlers):
+    """Replaces commands in md.
+
+    Args:
+        md (str): The markdown.
+        handlers (dict): Functions taking a :class:`Command` and returning its
+            replacement, by command key. If ``None`` is returned, the command is kept.
+
+    Returns:
+        Markdown: The markdown with replaced commands. Commands in replacements
+        are parsed, too, so later stages can handle them.
+    """
+    tokens = []
+    for token in parse(md).tokens:
+        if isinstance(token, Command) and token.key in handlers:
+            replacement = handlers[token.key](token)
+            if replacement is not None:
+                tokens.extend(parse(replacement).tokens)
+                continue
+        tokens.append(token)
+    return Markdown(tokens)
@@ -2,8 +2,8 @@ import logging
 import re
 from pathlib import Path
 
+import yaml
 from importlib_resources import files  # pragma: no cover
-from writio import load
 
 log = logging.getLogger(__name__)
 
@@ -19,11 +19,17 @@ STRUCTURE_FILE = "structure.yaml"
 FIGURE_DIR = "figures"
 TABLE_DIR = "tables"
 BUILD_DIR = "builds"
+CACHE_DIR = ".lingdocs-cache"
 COLSTART = "<<<columns---"
 COLEND = "---columns>>>"
 COLDIV = "---col---"
 
 
+def load_yaml(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=yaml.SafeLoader)
+
+
 def merge_dicts(a, b):
     for k1, v1 in b.items():
         if isinstance(v1, dict):
@@ -45,7 +51,7 @@ def merge_dicts(a, b):
 
 class Config:
     def __init__(self):
-        self.data = load(DATA_DIR / "config.yaml")
+        self.data = load_yaml(DATA_DIR / "config.yaml")
         self.fix_paths()
         self.dependents()
 
@@ -54,7 +60,7 @@ class Config:
         self.data["source"] = Path(path)
         if locp.is_file():
             log.debug(f"Loading config file from {locp}")
-            self.data = merge_dicts(self.data, load(locp))
+            self.data = merge_dicts(self.data, load_yaml(locp))
         else:
             log.warning(f"No config file found at {locp}")
         self.fix_paths()
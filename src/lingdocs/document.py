@@ -0,0 +1,69 @@
+"""The format-independent document model"""
+import copy
+import logging
+from pathlib import Path
+
+from lingdocs.commands import commands, join, parse
+from lingdocs.helpers import (
+    check_abbrevs,
+    extract_chapters,
+    load_figure_metadata,
+    process_labels,
+)
+from lingdocs.io import load_table_metadata
+from lingdocs.preprocessing import read_manual_example, read_table
+
+log = logging.getLogger(__name__)
+
+
+def _commands(md, key):
+    for command in commands(md, key):
+        yield command.url
+
+
+class Document:
+    """Everything about a lingdocs project that does not depend on the output format.
+    It is computed once per build and shared by all builders:
+
+    * the content parts and the concatenated content, parsed into commands
+    * the chapters and the labels and locations of sections, tables and figures
+    * the table and figure metadata
+    * the manual examples and tables referenced in the content, loaded from disk
+    * the glossing abbreviations
+
+    The glossing abbreviation candidates are cached in ``cache_dir``, by default
+    the build cache folder of the project."""
+
+    def __init__(self, contents, source_dir, dataset=None, cache_dir=None):
+        self.contents = contents
+        self.source_dir = Path(source_dir)
+        self.parsed = {
+            part_id: parse(part["content"]) for part_id, part in contents.items()
+        }
+        self.content = join(self.parsed.values(), "\n\n")
+        self.chapters = extract_chapters(self.content)
+        self.ref_labels, self.ref_locations = process_labels(self.chapters)
+        self.figure_metadata = load_figure_metadata(self.source_dir)
+        self.table_metadata = load_table_metadata(self.source_dir)
+        self.manual_examples = {
+            url: parse(read_manual_example(url, self.source_dir))
+            for url in dict.fromkeys(_commands(self.content, "manex"))
+        }
+        # tables can be referenced in the text or in manual examples
+        table_urls = _commands(
+            join([self.content, *self.manual_examples.values()], "\n"), "table"
+        )
+        self.tables = {
+            url: parse(read_table(url, self.table_metadata, self.source_dir))
+            for url in dict.fromkeys(table_urls)
+        }
+        if dataset is not None:
+            self.abbrev_dict = check_abbrevs(
+                dataset, self.source_dir, self.content, cache_dir=cache_dir
+            )
+        else:
+            self.abbrev_dict = {}
+
+    def table_metadata_copy(self):
+        """Table metadata for rendering captions and table notes, which happens in place."""
+        return copy.deepcopy(self.table_metadata)
@@ -0,0 +1,114 @@
+"""External programs started by lingdocs, like pandoc, latexmk and mkdocs.
+Every call is counted and timed by :data:`external_calls`, together with the
+place in lingdocs that caused it; a build can be limited to a number of calls
+with the ``output.max_processes`` setting."""
+import logging
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+PACKAGE_DIR = Path(__file__).parent
+# calls are attributed to the first frame outside of these files
+WRAPPER_FILES = {"external.py", "pandoc.py"}
+
+
+class BudgetExceeded(RuntimeError):
+    """More external processes were started than the budget allows."""
+
+
+def call_site(frame=None):
+    """The first lingdocs function up the stack that is not a wrapper,
+    e.g. ``formats.py:405 (preprocess)``."""
+    frame = frame or sys._getframe(1)  # pylint: disable=protected-access
+    while frame is not None:
+        path = Path(frame.f_code.co_filename)
+        if path.parent == PACKAGE_DIR and path.name not in WRAPPER_FILES:
+            return f"{path.name}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "-"
+
+
+class ExternalCalls:
+    """Calls and wall time by program and call site.
+
+    Args:
+        budget (int): The number of calls allowed before :class:`BudgetExceeded`
+            is raised (0: no limit).
+    """
+
+    def __init__(self, budget=0):
+        self.budget = budget
+        self.calls = {}
+
+    def reset(self, budget=0):
+        self.budget = budget
+        self.calls = {}
+
+    @property
+    def total(self):
+        return sum(values["calls"] for values in self.calls.values())
+
+    @contextmanager
+    def call(self, program):
+        """Wrap the start of an external program."""
+        site = call_site()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(program, site, time.perf_counter() - start)
+        self.check()
+
+    def add(self, program, site, wall, calls=1):
+        values = self.calls.setdefault((program, site), {"calls": 0, "wall": 0.0})
+        values["calls"] += calls
+        values["wall"] += wall
+
+    def check(self):
+        if self.budget and self.total > self.budget:
+            raise BudgetExceeded(
+                f"{self.total} external processes started, the budget is {self.budget} ("
+                + ", ".join(f"{k}: {v['calls']}" for k, v in self.totals().items())
+                + ")"
+            )
+
+    def totals(self):
+        """Calls and wall time by program."""
+        totals = {}
+        for (program, _), values in self.calls.items():
+            total = totals.setdefault(program, {"calls": 0, "wall": 0.0})
+            total["calls"] += values["calls"]
+            total["wall"] += values["wall"]
+        return totals
+
+    def report(self):
+        return [
+            {"program": program, "site": site, **values}
+            for (program, site), values in self.calls.items()
+        ]
+
+    def merge(self, report):
+        """Adds a report from a worker process."""
+        for values in report:
+            self.add(values["program"], values["site"], values["wall"], values["calls"])
+
+
+external_calls = ExternalCalls()
+
+
+def run(args, program=None, **kwargs):
+    """:func:`subprocess.run`, counted and timed.
+
+    Args:
+        args (list or str): The command, as for :func:`subprocess.run`.
+        program (str): The name the call is recorded under; defaults to the
+            name of the executable.
+    """
+    if program is None:
+        program = (args.split() if isinstance(args, str) else args)[0]
+    with external_calls.call(program):
+        return subprocess.run(args, check=False, **kwargs)
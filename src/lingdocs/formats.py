@@ -2,49 +2,71 @@
 import logging
 import re
 import shutil
-import subprocess
 import sys
 import threading
 import webbrowser
+from bisect import bisect_left
+from functools import partial
 from http.server import SimpleHTTPRequestHandler, test
 from pathlib import Path
 
-import panflute
+import pandas as pd
 from cookiecutter.main import cookiecutter
 from jinja2 import Environment, PackageLoader
 from jinja2.exceptions import TemplateNotFound
-from mkdocs.commands.serve import serve
-from mkdocs.config import load_config
 from slugify import slugify
 from tqdm import tqdm
 from writio import dump, load
 
+from lingdocs.cache import fingerprint
+from lingdocs.commands import expand
 from lingdocs.config import (
     COLDIV,
     COLEND,
     COLSTART,
     DATA_DIR,
     EXTRA_DIR,
-    MD_LINK_PATTERN,
     PLD_DIR,
     config,
     merge_dicts,
 )
+from lingdocs.external import run
 from lingdocs.helpers import (
     Enumerator,
+    OutputFiles,
     decorate_gloss_string,
     extract_chapters,
     get_sections,
     gloss_idify,
     html_example_wrap,
     html_gloss,
-    latexify_table,
+    html_gloss_decoration,
+    latexify_df,
     src,
+    upper_gloss_decoration,
 )
+from lingdocs.pandoc import broker, convert_text
+from lingdocs.plugins import Registry
+from lingdocs.profiling import profiler
 
 FIGURE_DIR = "figures"
 NUM_PRE = re.compile(r"[\d]+\ ")
 ABC_PRE = re.compile(r"[A-Z]+\ ")
+RELOAD_PATH = "/.lingdocs-preview"
+RELOAD_SCRIPT = f"""<script>
+(function () {{
+  var version = null;
+  setInterval(function () {{
+    fetch("{RELOAD_PATH}").then(function (r) {{ return r.text(); }}).then(function (v) {{
+      if (version !== null && v !== version) {{ location.reload(); }}
+      version = v;
+    }}).catch(function () {{}});
+  }}, 300);
+}})();
+</script>
+"""
+EX_PATTERN = re.compile(r"\[(sub)?ex-(?P<url>.*?)\]")
+EXREF_PATTERN = re.compile(r"\[exref-(?P<url>.*?)\](\((?P<end>.+)\))?")
 
 log = logging.getLogger(__name__)
 
@@ -106,6 +128,13 @@ def html_ref(url, *_args, **_kwargs):
 text_commands = ["todo"]
 
 
+def command_arguments(command):
+    """The arguments of a command; text commands take the whole URL."""
+    if command.key in text_commands:
+        return command.url, [], {}
+    return command.arguments
+
+
 class OutputFormat:
     name = "boilerplate"
     file_ext = "txt"
@@ -117,6 +146,8 @@ class OutputFormat:
     data_dir = "data"
     topic_dir = "topics"
     fallback_layout = "basic"
+    cache = None
+    cache_key = ""
 
     @property
     def label(cls):
@@ -154,7 +185,7 @@ class OutputFormat:
         return f"({cls.ref_labels[f'fig:{url}']}: {cls.figure_dir}/{filename})"
 
     def decorate_gloss_string(cls, x):
-        return decorate_gloss_string(x, decoration=lambda x: x.upper())
+        return decorate_gloss_string(x, decoration=upper_gloss_decoration)
 
     def get_layout_path(cls):
         base = DATA_DIR / "format_templates"
@@ -214,7 +245,7 @@ class OutputFormat:
             extra["author"] = cls.author_list([])
         if content is not None:
             content = content.replace("![](", "![](images/")
-            content = cls.preprocess(content)
+            content = cls.cached_preprocess(content)
             extra.update({"content": content})
 
         landingpage_path = source_dir / EXTRA_DIR / f"landingpage_{cls.name}.md"
@@ -224,13 +255,14 @@ class OutputFormat:
             extra["landingpage"] = ""
         extra.update(**metadata)
         template_path = cls.get_layout_path()
-        cookiecutter(
-            template_path,
-            output_dir=output_dir,
-            extra_context=extra,
-            overwrite_if_exists=True,
-            no_input=True,
-        )
+        with profiler.stage("cookiecutter"):
+            cookiecutter(
+                template_path,
+                output_dir=output_dir,
+                extra_context=extra,
+                overwrite_if_exists=True,
+                no_input=True,
+            )
 
         cls.adjust_layout(content, metadata=extra, source_dir=source_dir)
 
@@ -289,41 +321,37 @@ class OutputFormat:
             "exref": cls.exref_cmd,  # an example reference
             "figure": cls.figure_cmd,  # an image with a caption
         }
-        current = 0
-        for m in MD_LINK_PATTERN.finditer(content):
-            yield content[current : m.start()]
-            current = m.end()
-            key = m.group("label")
-            url = m.group("url")
-            args = []
-            cmd_kwargs = {}
-            if "?" in url and key not in text_commands:
-                url, arguments = url.split("?")
-                for arg in arguments.split("&"):
-                    if "=" in arg:
-                        k, v = arg.split("=")
-                        cmd_kwargs[k] = v
-                    else:
-                        args.append(arg)
-            if key == "src":
-                yield src(url)
-            elif key == "psrc":
-                yield src(url, parens=True)
-            elif key in doc_elements:
-                yield doc_elements[key](url, *args, **cmd_kwargs)
-            elif key == "abbrev_list":
-                yield cls.glossing_abbrevs_list(url)
-            else:
-                yield content[m.start() : m.end()]
-        yield content[current:]
+
+        def element(command):
+            url, args, cmd_kwargs = command_arguments(command)
+            return doc_elements[command.key](url, *args, **cmd_kwargs)
+
+        handlers = {key: element for key in doc_elements}
+        handlers["src"] = lambda command: src(command_arguments(command)[0])
+        handlers["psrc"] = lambda command: src(
+            command_arguments(command)[0], parens=True
+        )
+        handlers["abbrev_list"] = lambda command: cls.glossing_abbrevs_list(
+            command_arguments(command)[0]
+        )
+        return expand(content, handlers)
 
     def preprocess_commands(cls, content, **kwargs):
-        processed = "".join(cls.replace_commands(content, **kwargs))
-        return processed
+        return cls.replace_commands(content, **kwargs)
 
     def preprocess(cls, content):
         return content
 
+    def cached_preprocess(cls, content):
+        preprocess = profiler.stage("builder.preprocess")(cls.preprocess)
+        if cls.cache is None:
+            return preprocess(content)
+        return cls.cache.memoize(
+            cls.name,
+            fingerprint(cls.cache_key, "preprocess", content),
+            lambda: preprocess(content),
+        )
+
     def postprocess(cls, content, metadata=None):
         del metadata
         return content
@@ -362,6 +390,9 @@ class OutputFormat:
     def open_preview(cls):
         pass
 
+    def reload_preview(cls):
+        """Called after the preview was updated."""
+
     def compile(cls, source, output_dir):
         pass
 
@@ -370,9 +401,7 @@ class PlainText(OutputFormat):
     name = "plain"
 
     def preprocess(cls, content):
-        res = panflute.convert_text(
-            content, output_format="plain", input_format="markdown"
-        )
+        res = convert_text(content, output_format="plain", input_format="markdown")
         return res.replace("|WHITESPACE|", " ")
 
     def label_cmd(cls, url, *_args, **_kwargs):
@@ -385,52 +414,52 @@ class PlainText(OutputFormat):
         return f"[exref-{url}]"
 
     def postprocess(cls, content, metadata=None):
-        output = []
-        examples = []
-        exref_pattern = r"\[exref-(?P<url>.*?)\](\((?P<end>.+)\))?"
-        ex_pattern = r"\[(sub)?ex-(?P<url>.*?)\]"
+        lines = content.split("\n")
+        labels = {}  # position of an example: its number
+        positions = {}  # example url: positions
+        refs = {}  # line number: positions of exrefs
+        position = 0
         ex_cnt = 0
         subex_cnt = 0
-        for line in content.split("\n"):
-            ex_res = re.search(ex_pattern, line)
+        for n, line in enumerate(lines):
+            ex_res = EX_PATTERN.search(line)
             if ex_res:
                 url = ex_res.group("url")
                 if "sub" in ex_res.group(0):
                     subex_cnt += 1
                     letter = chr(ord("`") + subex_cnt)
-                    line = re.sub(ex_pattern, f"({letter})", line)
-                    examples.append((url, f"{ex_cnt}{letter}"))
+                    line = EX_PATTERN.sub(f"({letter})", line)
+                    labels[position] = f"{ex_cnt}{letter}"
                 else:
                     ex_cnt += 1
-                    line = re.sub(ex_pattern, f"({ex_cnt})", line)
+                    line = EX_PATTERN.sub(f"({ex_cnt})", line)
                     subex_cnt = 0
-                    examples.append((url, str(ex_cnt)))
-            for hit in re.finditer(exref_pattern, line):
-                hdic = hit.groupdict()
-                hdic["string"] = hit.group(0)
-                examples.append(hdic)
-            output.append(line)
-        content = "\n".join(output)
-        for i, example in enumerate(examples):
-            if isinstance(example, dict):
-                candidates = [
-                    tc
-                    for tc, x in enumerate(examples)
-                    if (isinstance(x, tuple) and x[0] == example["url"])
-                ]
-                if not candidates:
-                    log.warning(
-                        f"Could not resolve example reference {example['string']}"
-                    )
-                else:
-                    best = min(candidates, key=lambda x: abs(x - i))
-                    log.debug(
-                        f"Best candidate for example {example['url']} at position {i}: {best}"
-                    )
-                    content = content.replace(
-                        example["string"], f"({examples[best][1]})", 1
-                    )
-        return content
+                    labels[position] = str(ex_cnt)
+                positions.setdefault(url, []).append(position)
+                position += 1
+                lines[n] = line
+            for _ in EXREF_PATTERN.finditer(line):
+                refs.setdefault(n, []).append(position)
+                position += 1
+
+        def resolve(hit, i):
+            candidates = positions.get(hit.group("url"))
+            if not candidates:
+                log.warning(f"Could not resolve example reference {hit.group(0)}")
+                return hit.group(0)
+            k = bisect_left(candidates, i)
+            best = min(candidates[max(k - 1, 0) : k + 1], key=lambda x: abs(x - i))
+            log.debug(
+                f"Best candidate for example {hit.group('url')} at position {i}: {best}"
+            )
+            return f"({labels[best]})"
+
+        for n, ref_positions in refs.items():
+            ref_positions = iter(ref_positions)
+            lines[n] = EXREF_PATTERN.sub(
+                lambda hit: resolve(hit, next(ref_positions)), lines[n]
+            )
+        return "\n".join(lines)
 
 
 class HTML(PlainText):
@@ -466,10 +495,7 @@ class HTML(PlainText):
         return f"![Alt text](figures/{url}.jpg)"
 
     def decorate_gloss_string(cls, x):
-        return decorate_gloss_string(
-            x,
-            decoration=lambda x: f'<span class="gloss">{x}<span class="tooltiptext gloss-{x}" ></span></span>',
-        )
+        return decorate_gloss_string(x, decoration=html_gloss_decoration)
 
     def register_glossing_abbrevs(cls, abbrev_dict):
         return f"""var abbrev_dict={abbrev_dict}; for (var key in abbrev_dict){{
@@ -518,7 +544,7 @@ for (var i = 0; i < targets.length; i++) {{
         hits = re.findall(col_pattern, content)
         for hit in hits:
             content = content.replace(hit, slide_columns(hit))
-        html_output = panflute.convert_text(
+        html_output = convert_text(
             content,
             output_format="html",
             input_format="markdown",
@@ -549,16 +575,58 @@ for (var i = 0; i < targets.length; i++) {{
         return html_example_wrap(tag, content, kind=kind)
 
     class Handler(SimpleHTTPRequestHandler):
+        """Serves the preview; pages reload themselves when the preview changes."""
+
+        version = 0
+        folder = "html"
+
         def __init__(self, *args, **kwargs):
             super().__init__(
-                *args, directory=str(config["paths"]["output"] / "html"), **kwargs
+                *args,
+                directory=str(Path(config["paths"]["output"]) / self.folder),
+                **kwargs,
             )
 
+        def send_text(self, text, content_type):
+            body = text.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == RELOAD_PATH:
+                self.send_text(str(self.version), "text/plain")
+                return
+            path = Path(self.translate_path(self.path))
+            if path.is_dir():
+                path = path / "index.html"
+            if path.suffix == ".html" and path.is_file():
+                content = path.read_text(encoding="utf-8")
+                if "</body>" in content:
+                    content = content.replace("</body>", RELOAD_SCRIPT + "</body>", 1)
+                else:
+                    content += RELOAD_SCRIPT
+                self.send_text(content, "text/html")
+                return
+            super().do_GET()
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            if RELOAD_PATH not in str(args[0] if args else ""):
+                super().log_message(format, *args)
+
     def run_server(cls):
         test(cls.Handler)
 
     def run_preview(cls):
-        threading.Thread(target=cls.run_server).start()
+        server = threading.Thread(target=cls.run_server, daemon=True)
+        server.start()
+        return server
+
+    def reload_preview(cls):
+        cls.Handler.version += 1
 
 
 class MkDocs(HTML):
@@ -601,18 +669,29 @@ class MkDocs(HTML):
             content = "#" + metadata["title"] + "\n\n" + "\n".join(out)
         return content
 
+    def write_folder(cls, output_dir, source_dir, **kwargs):
+        # cookiecutter writes docs/index.md, which adjust_layout replaces
+        cls.files = OutputFiles()
+        if config["output"]["layout"] in ["book"]:
+            cls.files.remember(
+                [Path(config["paths"]["output"]) / cls.name / "docs" / "index.md"]
+            )
+        super().write_folder(output_dir, source_dir, **kwargs)
+
     def adjust_layout(cls, content, metadata, source_dir):
         if config["output"]["layout"] in ["book"]:
             chapters = extract_chapters(content, mode="pandoc")
-            doc_path = config["paths"]["output"] / "mkdocs" / "docs"
+            doc_path = Path(config["paths"]["output"]) / "mkdocs" / "docs"
+            files = getattr(cls, "files", None) or OutputFiles()
             for k, v in chapters.items():
-                dump(v, doc_path / f"{k}.md")
+                files.write(v, doc_path / f"{k}.md")
             index = f"""---
 hide:
     - navigation
 ---
 {metadata.get("landingpage", "")}"""
-            dump(index, doc_path / "index.md")
+            files.write(index, doc_path / "index.md")
+            log.debug(f"Chapter files for {cls.name}: {files}")
 
         custom_conf = source_dir / EXTRA_DIR / "mkdocs.yml"
         if custom_conf.is_file():
@@ -623,18 +702,17 @@ hide:
             dump(nconf, out_path)
 
     def table(cls, df, caption, label, tnotes, subtable=False):
-        tabular = df.to_html(escape=False, index=False)
-        tabular = panflute.convert_text(
-            tabular,
-            output_format="html",
-            input_format="markdown",
-        )
-        tabular = re.sub('style="(.*)"', "", tabular)
-        if not caption:
-            return "<br>" + tabular
-        return tabular.replace(
-            "<thead",
-            f"<caption class='table' id ='tab:{label}'>{caption}</caption><thead",
+        def add_caption(tabular):
+            tabular = re.sub('style="(.*)"', "", tabular)
+            if not caption:
+                return "<br>" + tabular
+            return tabular.replace(
+                "<thead",
+                f"<caption class='table' id ='tab:{label}'>{caption}</caption><thead",
+            )
+
+        return broker.submit(
+            df.to_html(escape=False, index=False), "html", then=add_caption
         )
 
     def figure_cmd(cls, url, *_args, **_kwargs):
@@ -660,8 +738,31 @@ hide:
     def todo_cmd(cls, url, *_args, **_kwargs):
         return mkdocs_todo(url, **_kwargs)
 
+    class Handler(HTML.Handler):
+        """Serves the site built by MkDocs."""
+
+        folder = "mkdocs/site"
+
+    def build_site(cls, dirty=False):
+        """Builds the MkDocs site for the preview; with ``dirty``, only changed
+        pages are built again."""
+        args = ["mkdocs", "build", "--quiet"] + (["--dirty"] if dirty else [])
+        result = run(
+            args,
+            cwd=Path(config["paths"]["output"]) / cls.name,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            log.error(f"Could not build the MkDocs site:\n{result.stderr}")
+
     def run_preview(cls):
-        log.warning(f"Not rendering live preview for format {cls.name}.")
+        cls.build_site()
+        return super().run_preview()
+
+    def reload_preview(cls):
+        cls.build_site(dirty=True)
+        super().reload_preview()
 
     def compile(cls, source, output_dir):
         log.info("Compiling MkDocs HTML.")
@@ -675,7 +776,7 @@ hide:
         temp["site_url"] = "http://www.example.com/"
         temp["plugins"].append("offline")
         dump(temp, mkd_file)
-        subprocess.run("mkdocs build".split(" "), cwd=source / output_dir / cls.name)
+        run(["mkdocs", "build"], cwd=source / output_dir / cls.name)
         dump(old, mkd_file)
 
 
@@ -730,7 +831,7 @@ class GitHub(PlainText):
         toc = []
         for level, title, tag in get_sections(content):
             toc.append("   " * level + f"1. [{title}](#{tag})")
-        res = panflute.convert_text(
+        res = convert_text(
             "\n".join(toc) + "\n\n" + content,
             output_format="gfm",
             input_format="markdown",
@@ -764,7 +865,7 @@ class CLLD(PlainText):
             if len(df) == 0:
                 df = df.append({x: "" for x in df.columns}, ignore_index=True)
             return df.to_markdown(index=False)
-        cap = "".join(cls.replace_commands(caption))
+        cap = cls.replace_commands(caption)
         return (
             f"<a id='tab:{label}'></a><div class='caption table' id='tab:{label}'>{cap}</div>\n\n"
             + df.to_markdown(index=False)
@@ -844,13 +945,12 @@ class Latex(PlainText):
         if df is None:
             tabular = ""
         elif len(df) == 0:
-            df = df.append({x: x for x in df.columns}, ignore_index=True)
-            df = df.applymap(latexify_table)
-            tabular = df.to_latex(escape=False, index=False, header=False)
+            df = pd.DataFrame([{x: x for x in df.columns}], columns=df.columns)
+            tabular = latexify_df(df, header=False).to_latex(
+                escape=False, index=False, header=False
+            )
         else:
-            df = df.applymap(latexify_table)
-            df.columns = list(map(latexify_table, df.columns))
-            tabular = df.to_latex(escape=False, index=False)
+            tabular = latexify_df(df).to_latex(escape=False, index=False)
 
         if not caption:  # tables in examples are handled differently
             return (
@@ -860,9 +960,7 @@ class Latex(PlainText):
                 .replace("\\begin{tabular}{", "\\begin{tabular}[t]{")  # top aligned
             )
         return f"""\\begin{{table}}
-\\caption{{{panflute.convert_text(
-            caption, output_format="latex", input_format="markdown"
-        )}}}
+\\caption{{{broker.submit(caption, "latex")}}}
 \\label{{tab:{label}}}
 \\centering
 {tabular}
@@ -890,7 +988,7 @@ class Latex(PlainText):
             toplevel = "chapter"
         else:
             toplevel = "section"
-        doc = panflute.convert_text(
+        doc = convert_text(
             "\n".join(out),
             output_format="latex",
             input_format="markdown-auto_identifiers",
@@ -924,42 +1022,29 @@ class Latex(PlainText):
             "exref": cls.exref_cmd,  # an example reference
             "figure": cls.figure_cmd,  # an image with a caption
         }
-        current = 0
-        for m in MD_LINK_PATTERN.finditer(content):
-            yield content[current : m.start()]
-            current = m.end()
-            key = m.group("label")
-            url = m.group("url")
-            args = []
-            elementkwargs = {**{}, **kwargs}
-            if "?" in url and key not in text_commands:
-                url, arguments = url.split("?")
-                for arg in arguments.split("&"):
-                    if "=" in arg:
-                        k, v = arg.split("=")
-                        elementkwargs[k] = v
-                    else:
-                        args.append(arg)
-            if key == "src":
-                yield src(url, mode="biblatex", full="full" in args)
-            elif key == "psrc":
-                yield src(url, parens=True, mode="biblatex", full="full" in args)
-            elif key in doc_elements:
-                yield doc_elements[key](url, *args, **elementkwargs)
-            elif key == "abbrev_list":
-                yield cls.glossing_abbrevs_list(url)
-            else:
-                yield content[m.start() : m.end()]
-        yield content[current:]
+
+        def element(command):
+            url, args, cmd_kwargs = command_arguments(command)
+            return doc_elements[command.key](url, *args, **{**kwargs, **cmd_kwargs})
+
+        def source(command, parens=False):
+            url, args, _ = command_arguments(command)
+            return src(url, parens=parens, mode="biblatex", full="full" in args)
+
+        handlers = {key: element for key in doc_elements}
+        handlers["src"] = source
+        handlers["psrc"] = partial(source, parens=True)
+        handlers["abbrev_list"] = lambda command: cls.glossing_abbrevs_list(
+            command_arguments(command)[0]
+        )
+        return expand(content, handlers)
 
     def compile(cls, source, output_dir):
         log.info("Compiling LaTeX document.")
-        p = subprocess.Popen(
-            "latexmk --xelatex main.tex",
-            shell=True,
+        run(
+            ["latexmk", "--xelatex", "main.tex"],
             cwd=source / output_dir / cls.name,
         )
-        p.wait()
 
 
 class Docx(GitHub):
@@ -972,9 +1057,7 @@ class Docx(GitHub):
     def adjust_layout(cls, content, metadata):
         target = config["paths"]["output"] / cls.name / "document.md"
         if target.is_file():
-            import subprocess
-
-            process = subprocess.Popen(
+            run(
                 [
                     "pandoc",
                     str(target),
@@ -996,13 +1079,7 @@ class Docx(GitHub):
         return f"{caption}{{#tbl:{label}}}\n" + df.to_markdown(index=False)
 
 
-builders = {
-    x.name: x for x in [PlainText, GitHub, Latex, HTML, CLLD, MkDocs, SSG, Docx]
-}
-
-if Path(f"{PLD_DIR}/formats.py").is_file():
-    sys.path.insert(1, str(PLD_DIR))
-    from formats import formats
-
-    for fmt in formats:
-        builders[fmt.name] = fmt
+builders = Registry(
+    "format",
+    {x.name: x for x in [PlainText, GitHub, Latex, HTML, CLLD, MkDocs, SSG, Docx]},
+)
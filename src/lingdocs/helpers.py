@@ -1,14 +1,17 @@
 """Various helpers"""
+import atexit
 import importlib.util
 import json
 import logging
+import os
 import re
+import shutil
 import sys
 import tempfile
+from functools import lru_cache, partial
 from pathlib import Path
 
 import pandas as pd
-import panflute
 import pybtex
 import pycldf
 import yaml
@@ -19,7 +22,15 @@ from pycldf import Dataset, Source
 from slugify import slugify
 from writio import dump, load
 
+from lingdocs.cache import (
+    LINGDOCS_VERSION,
+    BuildCache,
+    dataset_fingerprint,
+    fingerprint,
+    snapshot_dataset,
+)
 from lingdocs.config import (
+    CACHE_DIR,
     CONTENT_FOLDER,
     DATA_DIR,
     EXTRA_DIR,
@@ -28,7 +39,10 @@ from lingdocs.config import (
     TABLE_DIR,
     config,
 )
+from lingdocs.index import dataset_index
 from lingdocs.metadata import ORCID_STR
+from lingdocs.pandoc import broker
+from lingdocs.structure import _get_relative_file, get_structure  # noqa: F401
 
 log = logging.getLogger(__name__)
 
@@ -56,6 +70,59 @@ def write_file(content, path, mode=None, encoding="utf-8"):
             f.write(content)
 
 
+class OutputFiles:
+    """Writes generated text files, leaving files with unchanged content untouched
+    so that their modification times stay the same, and removes files that are
+    no longer generated."""
+
+    def __init__(self):
+        self.written = 0
+        self.skipped = 0
+        self.removed = 0
+        self.previous = {}
+
+    def remember(self, paths):
+        """Keeps the content and modification time of files that another tool
+        is about to overwrite. Writing the same content again afterwards counts
+        as unchanged and restores the modification time."""
+        for path in map(Path, paths):
+            if path.is_file():
+                stat = path.stat()
+                self.previous[path] = (
+                    path.read_bytes(),
+                    (stat.st_atime_ns, stat.st_mtime_ns),
+                )
+
+    def write(self, content, path):
+        path = Path(path)
+        data = content.encode("utf-8")
+        previous, times = self.previous.pop(path, (None, None))
+        if path.is_file() and path.read_bytes() == data:
+            self.skipped += 1
+        elif previous == data:
+            path.write_bytes(data)
+            self.skipped += 1
+        else:
+            dump(content, path)
+            self.written += 1
+            return
+        if times:
+            os.utime(path, ns=times)
+
+    def remove_orphans(self, folder, keep, pattern="*"):
+        """Removes the files matching a pattern in a folder, except those in ``keep``."""
+        keep = {Path(path).name for path in keep}
+        for path in Path(folder).glob(pattern):
+            if path.is_file() and path.name not in keep:
+                path.unlink()
+                self.removed += 1
+
+    def __str__(self):
+        return (
+            f"{self.written} written, {self.skipped} unchanged, {self.removed} removed"
+        )
+
+
 def parse_heading(string, mode="pandoc"):
     prefix = string.split(" ")[0]
     level = prefix.count("#")
@@ -88,7 +155,7 @@ def get_glosses(word, gloss_cands):
     for j, part in enumerate(parts):
         if is_gloss_abbr_candidate(part, parts, j):
             # take care of numbered genders
-            if not (part[0] == "G" and re.match(r"\d", part[1:])):
+            if not (part[0] == "G" and GENDER_NUMBER_PATTERN.match(part[1:])):
                 for gloss in resolve_glossing_combination(part):
                     if gloss not in gloss_cands:
                         yield gloss
@@ -179,18 +246,50 @@ def gloss_idify(gloss):
     return gloss.replace("~", "")
 
 
-def check_abbrevs(dataset, source_dir, content):
+@lru_cache(maxsize=None)
+def _leipzig():
     with open(DATA_DIR / "leipzig.yaml", encoding="utf-8") as f:
-        leipzig = yaml.load(f, Loader=yaml.SafeLoader)
-    gloss_cands = []
-    if "ExampleTable" in dataset:
+        return yaml.load(f, Loader=yaml.SafeLoader)
+
+
+def gloss_candidates(dataset, cache_dir=None):
+    """Potential glossing abbreviations in the examples of a dataset, in order.
+    The result is kept per dataset fingerprint in the build cache, by default
+    the one in the output folder of the project."""
+    if "ExampleTable" not in dataset:
+        return []
+
+    def extract():
+        cands = {}
         for ex in dataset.iter_rows("ExampleTable"):
             for word in ex["Gloss"]:
-                if not word:
-                    continue
-                gloss_cands.extend(get_glosses(word, gloss_cands))
+                if word:
+                    cands.update(dict.fromkeys(get_glosses(word, cands)))
+        return list(cands)
+
+    def load():
+        cache = BuildCache(
+            cache_dir or project_cache_dir(), enabled=config["output"]["cache"]
+        )
+        key = fingerprint(
+            LINGDOCS_VERSION,
+            index.memo("fingerprint", lambda: dataset_fingerprint(dataset)),
+        )
+        cands = cache.memoize("abbrevs", key, extract)
+        cache.prune("abbrevs")
+        return cands
+
+    index = dataset_index(dataset)
+    return index.memo("gloss_candidates", load)
+
+
+def check_abbrevs(dataset, source_dir, content, cache_dir=None):
+    leipzig = _leipzig()
+    gloss_cands = dict.fromkeys(
+        gloss_candidates(dataset, cache_dir or project_cache_dir(source_dir))
+    )
     for text_gloss in re.findall(r"\[gl\]\((.*?)\)", content):
-        gloss_cands.append(text_gloss)
+        gloss_cands[text_gloss] = None
     abbrev_dict = {}
 
     for table in dataset.tables:  # add abbreviations found in the CLDF dataset
@@ -206,15 +305,13 @@ def check_abbrevs(dataset, source_dir, content):
             abbrev_df["ID"] = abbrev_df["ID"].apply(slugify)
         for rec in abbrev_df.to_dict("records"):
             abbrev_dict[rec["ID"]] = rec["Description"]
-    gloss_cands = list(dict.fromkeys(gloss_cands))
-    for x in map(lambda x: slugify(x.lower()), gloss_cands):
-        if x not in abbrev_dict:
-            abbrev_dict[x] = leipzig.get(x, "unknown abbreviation")
-    unaccounted = [
-        x
-        for x in gloss_cands
-        if abbrev_dict[slugify(x.lower().replace("~", ""))] == "unknown abbreviation"
-    ]
+    unaccounted = []
+    for x in gloss_cands:
+        slug = slugify(gloss_idify(x.lower()))
+        if slug not in abbrev_dict:
+            abbrev_dict[slug] = leipzig.get(slug, "unknown abbreviation")
+        if abbrev_dict[slug] == "unknown abbreviation":
+            unaccounted.append(x)
     if len(unaccounted) > 0:
         log.warning(
             "Glosses identified as abbreviations but not specified in glossing abbreviation table:"
@@ -368,14 +465,6 @@ def html_example_wrap(tag, content, kind="example"):
 </ol>"""
 
 
-def _get_relative_file(folder, file):
-    folder = Path(folder)
-    file = Path(file)
-    if file.name == str(file):
-        return folder / file
-    return file
-
-
 def sanitize_latex(unsafe_str):
     for o, r in (
         ("\\\\", "\\textbackslash{}\\"),
@@ -456,18 +545,79 @@ def table_metadata(table_name):
     return jsonlib.load(path)
 
 
-def load_cldf_dataset(cldf_path, source_dir=None):
+def _scratch_dir():
+    path = Path(tempfile.mkdtemp(prefix="lingdocs-cldf-"))
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def _link(source, target):
+    try:
+        target.symlink_to(source, target_is_directory=source.is_dir())
+    except OSError:
+        if source.is_dir():
+            shutil.copytree(source, target)
+        else:
+            shutil.copy(source, target)
+
+
+def overlay_dataset(ds, mutable=()):
+    """Makes a dataset writable without copying it.
+    A scratch folder with links to everything in the dataset folder is created;
+    only the metadata, the sources and the files in ``mutable`` are real files there;
+    files in ``mutable`` that do not exist yet can be written by the caller.
+
+    Returns:
+        pycldf.Dataset: the dataset, read from the scratch folder
+    """
+    temp_path = _scratch_dir()
+    materialized = {ds.filename, ds.bibname, *mutable}
+    for path in Path(ds.directory).iterdir():
+        if path.name not in materialized:
+            _link(path.resolve(), temp_path / path.name)
+    # mutable files are copied if they exist, so they can be rewritten
+    for name in [ds.bibname, *mutable]:
+        if (Path(ds.directory) / name).is_file():
+            shutil.copy(Path(ds.directory) / name, temp_path / name)
+    shutil.copy(ds.tablegroup._fname, temp_path / ds.filename)
+    return Dataset.from_metadata(temp_path / ds.filename)
+
+
+def project_cache_dir(source_dir=None):
+    """The build cache folder in the output folder of a project."""
+    source_dir = Path(source_dir or config.data.get("source", "."))
+    return source_dir / config["paths"]["output"] / CACHE_DIR
+
+
+def load_cldf_dataset(cldf_path, source_dir=None, cache_dir=None):
+    """Loads a CLDF dataset for a project.
+
+    Args:
+        cldf_path: The path to the metadata file.
+        source_dir: The project folder; with it, the topics and additional
+            references of the project are added.
+        cache_dir: The build cache folder, where the tables are snapshotted;
+            by default the one in the output folder of the project.
+    """
     try:
+        if source_dir:
+            source_dir = Path(source_dir)
+            config.load_from_dir(source_dir)
         ds = Dataset.from_metadata(cldf_path)
-        temp_path = Path(tempfile.gettempdir()) / "cldf"
-        ds.copy(dest=temp_path)
         orig_id = ds.metadata_dict.get("rdf:ID", None)
-        ds = Dataset.from_metadata(temp_path / ds.filename)
+        if config["input"].get("cldf_overlay", True):
+            ds = overlay_dataset(ds, mutable=[table_metadata("TopicTable")["url"]])
+        else:
+            temp_path = _scratch_dir()
+            ds.copy(dest=temp_path)
+            ds = Dataset.from_metadata(temp_path / ds.filename)
+        if config["input"].get("cldf_snapshot", True):
+            snapshot_dataset(
+                ds, Path(cache_dir or project_cache_dir(source_dir)) / "cldf"
+            )
         ds.add_provenance(wasDerivedFrom=orig_id)
         if not source_dir:
             return ds
-        source_dir = Path(source_dir)
-        config.load_from_dir(source_dir)
         if Path(config["paths"]["add_bib"]).is_file():
             bib = pybtex.database.parse_file(
                 config["paths"]["add_bib"], bib_format="bibtex"
@@ -499,39 +649,6 @@ def load_cldf_dataset(cldf_path, source_dir=None):
         sys.exit(1)
 
 
-def get_structure(structure_file, prefix_mode=None):
-    counters = {1: 0, 2: 0, 3: 0, 4: 0}
-    files = load(structure_file)
-    if not files:
-        log.error(
-            f"Please create a {STRUCTURE_FILE} file in your {CONTENT_FOLDER} folder."
-        )
-        sys.exit()
-    contents = {}
-    prefix_choices = ["alpha", "numerical"]
-    for file, values in files.items():
-        contents[file] = values
-        if prefix_mode not in prefix_choices:
-            prefix = ""
-        else:
-            level = values.get("level", 1)
-            i = 4
-            while i > level:
-                counters[i] = 0
-                i -= 1
-            counters[level] += 1
-            numbering = ".".join([str(x) for x in counters.values() if x > 0])
-            if prefix_mode == "numerical":
-                prefix = "".join([str(x) for x in counters.values()]) + " "
-            else:
-                prefix = (
-                    "".join([chr(x + 64) for x in counters.values() if x > 0]) + " "
-                )
-            contents[file]["numbering"] = numbering
-        contents[file]["filename"] = prefix + file + ".md"
-    return contents
-
-
 def load_content(source_dir=CONTENT_FOLDER, structure_file="docs/structure.yaml"):
     contents = get_structure(
         prefix_mode="", structure_file=structure_file
@@ -644,17 +761,38 @@ def get_md_pattern(m):
 latex_repl = {"%": "\\%"}
 
 
+# markdown cells converted to LaTeX in this build (or placeholders until then)
+latex_cells = {}
+
+
+def _remember_latex(cell, result):
+    latex_cells[cell] = result
+    return result
+
+
 def latexify_table(cell):
     cell = str(cell)
     for a, b in latex_repl.items():
         cell = cell.replace(a, b)
     if "_" in cell or "*" in cell:
-        return panflute.convert_text(
-            cell, output_format="latex", input_format="markdown"
-        )
+        if cell not in latex_cells:
+            latex_cells[cell] = broker.submit(
+                cell, "latex", then=partial(_remember_latex, cell)
+            )
+        return latex_cells[cell]
     return cell
 
 
+def latexify_df(df, header=True):
+    """Converts the cells (and headers) of a table to LaTeX.
+    Every distinct value is only converted once."""
+    values = {value: latexify_table(value) for value in pd.unique(df.values.ravel())}
+    df = df.apply(lambda col: col.map(values))
+    if header:
+        df.columns = [latexify_table(col) for col in df.columns]
+    return df
+
+
 def write_readme(metadata_file, release=False):
     log.warning("readmes are not implemented")
     # bib = ""# todo: _load_bib(metadata_file)
@@ -745,18 +883,21 @@ def is_gloss_abbr_candidate(part, parts, j):
     )
 
 
+GLOSS_DELIMITER_PATTERN = re.compile(r"([" + "|".join(glossing_delimiters) + "])")
+GENDER_NUMBER_PATTERN = re.compile(r"\d")
+GLOSS_CACHE_SIZE = 2**16
+
+
 def split_word(word):
     """Splits a word up into morphemes and glossing_delimiters"""
-    parts = re.split(r"([" + "|".join(glossing_delimiters) + "])", word)
-    parts = [x for x in parts if x != ""]
-    return parts
+    return [x for x in GLOSS_DELIMITER_PATTERN.split(word) if x != ""]
 
 
 def resolve_glossing_combination(input_string):
     output = []
     temp_text = ""
-    for i, char in enumerate(list(input_string)):
-        if re.match(r"[1-3]+", char):
+    for i, char in enumerate(input_string):
+        if char in "123":
             if i < len(input_string) - 1 and input_string[i + 1] == "+":
                 temp_text += char
             elif input_string[i - 1] == "+":
@@ -775,37 +916,57 @@ def resolve_glossing_combination(input_string):
     return output
 
 
-def decorate_gloss_string(input_string, decoration=lambda x: f"\\gl{{{x}}}"):
+def latex_gloss_decoration(x):
+    return f"\\gl{{{x}}}"
+
+
+def html_gloss_decoration(x):
+    return f'<span class="gloss">{x}<span class="tooltiptext gloss-{x}" ></span></span>'
+
+
+def upper_gloss_decoration(x):
+    return x.upper()
+
+
+@lru_cache(maxsize=GLOSS_CACHE_SIZE)
+def decorate_gloss_word(word, decoration=latex_gloss_decoration):
+    """Decorates the glossing abbreviations in a single word.
+    Results are cached, so ``decoration`` should be a module-level function."""
+    # take proper nouns into account
+    if len(word) == 2 and word[0] == word[0].upper() and word[1] == ".":
+        return word
+    output = ""
+    parts = split_word(word)
+    for j, part in enumerate(parts):
+        if is_gloss_abbr_candidate(part, parts, j):
+            # take care of numbered genders
+            if part[0] == "G" and GENDER_NUMBER_PATTERN.match(part[1:]):
+                output += decoration(part.lower())
+                # if the number should not be part of the abbreviation:
+                # output += (
+                #     decoration(part[0].lower()) + part[1:]
+                # )
+            else:
+                for glosspart in resolve_glossing_combination(part):
+                    output += decoration(glosspart.lower())
+        else:
+            output += part
+    return output
+
+
+def gloss_cache_stats():
+    """Hits and misses of the gloss decoration cache in this process."""
+    info = decorate_gloss_word.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+
+def decorate_gloss_string(input_string, decoration=latex_gloss_decoration):
     if not input_string:
         return ""
-    gloss_list = input_string.split(" ")
-    for i, gloss in enumerate(gloss_list):  # pylint: disable=too-many-nested-blocks
-        res = []
-        for word in gloss.split("_"):
-            output = " "
-            # take proper nouns into account
-            if len(word) == 2 and word[0] == word[0].upper() and word[1] == ".":
-                output += word
-            else:
-                parts = split_word(word)
-                for j, part in enumerate(parts):
-                    if is_gloss_abbr_candidate(part, parts, j):
-                        # take care of numbered genders
-                        if part[0] == "G" and re.match(r"\d", part[1:]):
-                            output += decoration(part.lower())
-                            # if the number should not be part of the abbreviation:
-                            # output += (
-                            #     decoration(part[0].lower()) + part[1:]
-                            # )
-                        else:
-                            for glosspart in resolve_glossing_combination(part):
-                                output += decoration(glosspart.lower())
-                    else:
-                        output += part
-            res.append(output[1:])
-        gloss_list[i] = "_".join(res)
-    gloss_text_upcased = " ".join(gloss_list)
-    return gloss_text_upcased
+    return " ".join(
+        "_".join(decorate_gloss_word(word, decoration) for word in gloss.split("_"))
+        for gloss in input_string.split(" ")
+    )
 
 
 def refresh_clld_db(clld_folder):
@@ -0,0 +1,95 @@
+"""In-memory lookup of CLDF rows by ID"""
+import logging
+import weakref
+
+log = logging.getLogger(__name__)
+
+ID_PROPERTY = "http://cldf.clld.org/v1.0/terms.rdf#id"
+
+
+class DatasetIndex:
+    """ID-to-row mappings for the tables of a CLDF dataset.
+    Every table is read once, the first time it is used; foreign keys are
+    resolved with the index of the referenced table.
+    The rows are shared by all users and must not be modified.
+    Available in templates as ``index``, e.g. ``index.get("LanguageTable", "apa")``
+    or ``index.join("ExampleTable", ex_id, "languageReference")``."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.tables = {}
+        self.memos = {}
+
+    def table(self, name):
+        """The rows of a table (component name or file name), by ID."""
+        table = self.dataset[name]  # raises SchemaError for unknown tables
+        key = str(table.url)
+        if key not in self.tables:
+            log.debug(f"Indexing {key}")
+            try:
+                id_col = self.dataset[name, ID_PROPERTY].name
+            except KeyError:
+                id_col = "ID"
+            self.tables[key] = {row[id_col]: row for row in self.dataset[name]}
+        return self.tables[key]
+
+    def __getitem__(self, name):
+        return self.table(name)
+
+    def __contains__(self, name):
+        try:
+            self.dataset[name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, name, rid, default=None):
+        """A single row, or ``default``."""
+        return self.table(name).get(rid, default)
+
+    def ids(self, name):
+        return list(self.table(name))
+
+    def rows(self, name):
+        return list(self.table(name).values())
+
+    def join(self, name, rid, column):
+        """The row(s) referenced by a foreign key column of a row.
+
+        Args:
+            name (str): The table.
+            rid (str): The ID of the row.
+            column (str): The column name or CLDF property, e.g. ``languageReference``.
+
+        Returns:
+            dict or list: The referenced row, or a list of rows for list-valued columns.
+        """
+        col = self.dataset[name, column]
+        target = None
+        for fk in self.dataset[name].tableSchema.foreignKeys:
+            if fk.columnReference == [col.name]:
+                target = str(fk.reference.resource)
+        if target is None:
+            raise KeyError(f"{name}.{col.name} is not a foreign key")
+        value = self.get(name, rid, {}).get(col.name)
+        if isinstance(value, list):
+            return [self.get(target, x) for x in value]
+        if value is None:
+            return None
+        return self.get(target, value)
+
+    def memo(self, key, func):
+        """Data derived from the dataset, computed once."""
+        if key not in self.memos:
+            self.memos[key] = func()
+        return self.memos[key]
+
+
+_indexes = weakref.WeakKeyDictionary()
+
+
+def dataset_index(dataset):
+    """The :class:`DatasetIndex` of a dataset; created on first use."""
+    if dataset not in _indexes:
+        _indexes[dataset] = DatasetIndex(dataset)
+    return _indexes[dataset]
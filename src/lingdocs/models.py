@@ -1,11 +1,11 @@
 import logging
-import sys
 from pathlib import Path
 
 import pycldf
 from clldutils import jsonlib
 
-from lingdocs.config import DATA_DIR, PLD_DIR
+from lingdocs.config import DATA_DIR
+from lingdocs.plugins import Instances, Registry
 
 log = logging.getLogger(__name__)
 
@@ -158,22 +158,21 @@ class Topic(Base):
     shortcut = "top"
 
 
-models = [
-    Morpheme(),
-    Morph(),
-    Wordform(),
-    Example(),
-    Language(),
-    Text(),
-    Cognateset(),
-    Form(),
-    Topic(),
-]
-
-if Path(f"{PLD_DIR}/models.py").is_file():
-    sys.path.insert(1, str(PLD_DIR))
-    from models import models as custom_models
-
-    for mm in custom_models:
-        log.info(f"Using custom model {mm.name.lower()}")
-        models.append(mm())
+model_classes = Registry(
+    "model",
+    {
+        x.name: x
+        for x in [
+            Morpheme,
+            Morph,
+            Wordform,
+            Example,
+            Language,
+            Text,
+            Cognateset,
+            Form,
+            Topic,
+        ]
+    },
+)
+models = Instances(model_classes)
@@ -1,110 +1,75 @@
 """Builders producing different output formats"""
+import copyreg
 import logging
+import os
 import re
 import shutil
-import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path, PosixPath
 
-import hupper
 from cldf_rel import CLDFDataset, get_table_name
-from cldfviz.text import render
+from pycldf import Source
 from tqdm import tqdm
-from writio import dump, load
-
-from lingdocs.config import BENCH, CONTENT_FOLDER, EXTRA_DIR, STRUCTURE_FILE, config
+from writio import load
+
+from lingdocs.cache import (
+    LINGDOCS_VERSION,
+    BuildCache,
+    dataset_fingerprint,
+    fingerprint,
+    source_fingerprint,
+)
+from lingdocs.commands import Command, join, locate
+from lingdocs.config import (
+    CACHE_DIR,
+    CONTENT_FOLDER,
+    EXTRA_DIR,
+    FIGURE_DIR,
+    MANEX_DIR,
+    PLD_DIR,
+    STRUCTURE_FILE,
+    TABLE_DIR,
+    config,
+)
+from lingdocs.document import Document
+from lingdocs.external import external_calls, run
 from lingdocs.formats import builders
 from lingdocs.helpers import (
-    _get_relative_file,
-    check_abbrevs,
-    extract_chapters,
+    OutputFiles,
     func_dict,
-    get_structure,
+    gloss_cache_stats,
     load_content,
-    load_figure_metadata,
-    process_labels,
     read_file,
+    split_ref,
     table_label,
     write_file,
 )
+from lingdocs.index import dataset_index
+from lingdocs.models import models
 from lingdocs.postprocessing import postprocess
 from lingdocs.preprocessing import (
+    _audio_dict,
     _load_templates,
     loaders,
     preprocess,
     preprocess_cldfviz,
+    render_cldf,
     render_markdown,
 )
-
-NUM_PRE = re.compile(r"[\d]+\ ")
-ABC_PRE = re.compile(r"[A-Z]+\ ")
+from lingdocs.profiling import profiler
+from lingdocs.structure import _get_relative_file
+from lingdocs.structure import update_structure  # noqa: F401
+from lingdocs.templates import _scan, invalidate_templates
 
 log = logging.getLogger(__name__)
 
 
-def update_structure(
-    content_dir=CONTENT_FOLDER,
-    bench_dir=BENCH,
-    structure_file=STRUCTURE_FILE,
-    prefix_mode=config["input"]["content_file_prefix"],
-):
-    log.debug("Updating document structure")
-
-    content_files = {}
-    for file in content_dir.iterdir():
-        if ".md" not in file.name:
-            continue
-        name = re.sub(NUM_PRE, "", file.stem)
-        name = re.sub(ABC_PRE, "", name)
-        content_files[name] = file
-
-    bench_files = {}
-    if Path(bench_dir).is_dir():
-        for file in bench_dir.iterdir():
-            if ".md" not in file.name:
-                continue
-            name = re.sub(NUM_PRE, "", file.stem)
-            name = re.sub(ABC_PRE, "", name)
-            bench_files[name] = file
-
-    structure = get_structure(
-        prefix_mode=prefix_mode,
-        structure_file=_get_relative_file(content_dir, structure_file),
-    )
-
-    for part_id, data in structure.items():
-        new_path = Path(content_dir, data["filename"])
-        if part_id in content_files:
-            if part_id in bench_files:
-                log.warning(f"Conflict: {part_id}. Resolve manually.")
-            else:
-                if content_files[part_id] != new_path:
-                    log.info(f"'{part_id}': {content_files[part_id]} > {new_path}")
-                    content_files[part_id].rename(new_path)
-                del content_files[part_id]
-        elif part_id in bench_files:
-            if bench_files[part_id] != new_path:
-                log.info(f"'{part_id}': moving {bench_files[part_id]} > {new_path}")
-                bench_files[part_id].rename(new_path)
-            del bench_files[part_id]
-        else:
-            log.info(f"'{part_id}': creating file {new_path}")
-            new_path.touch()
-
-    for file in content_files.values():
-        if not bench_dir.is_dir():
-            log.info(f"Creating {bench_dir} for unused files.")
-            bench_dir.mkdir()
-        new_path = Path(bench_dir, file.name)
-        log.info(f"Unlisted: moving {file} > {new_path}")
-        file.rename(new_path)
-
-
 def compile_latex(output_dir=config["paths"]["output"]):  # pragma: no cover
     log.info("Compiling LaTeX document.")
-    with subprocess.Popen(
-        "latexmk --quiet --xelatex main.tex", shell=True, cwd=output_dir / "latex"
-    ) as proc:
-        del proc  # help, prospector is forcing me
+    run(["latexmk", "--quiet", "--xelatex", "main.tex"], cwd=output_dir / "latex")
 
 
 # def preview(output_format, **kwargs):
@@ -112,38 +77,94 @@ def compile_latex(output_dir=config["paths"]["output"]):  # pragma: no cover
 #     _preview(builder=builder, **kwargs)
 
 
-def preview(dataset, source_dir, output_dir, builder, refresh=True, **kwargs):
-    log.info("Rendering preview")
-
-    watchfiles = [str(x) for x in source_dir.iterdir()]
-    watchfiles += [str(x) for x in (source_dir / CONTENT_FOLDER).iterdir()]
-    tpath = source_dir / "tables"
-    if tpath.is_dir():
-        watchfiles += [str(x) for x in tpath.iterdir()]
-    extra = source_dir / EXTRA_DIR
-    if extra.is_dir():
-        watchfiles += [str(x) for x in extra.iterdir()]
+def _watched_files(source_dir):
+    """Modification times of the files the preview depends on."""
+    state = {}
+    for path in source_dir.iterdir():
+        try:
+            if path.is_file():
+                state[str(path)] = path.stat().st_mtime_ns
+        except OSError:
+            continue
+    for folder in [
+        CONTENT_FOLDER,
+        TABLE_DIR,
+        EXTRA_DIR,
+        MANEX_DIR,
+        FIGURE_DIR,
+        PLD_DIR,
+    ]:
+        state.update(_scan(source_dir / folder))
+    return state
+
+
+def _load_preview_content(source_dir):
     structure_file = _get_relative_file(
         folder=source_dir / CONTENT_FOLDER, file=STRUCTURE_FILE
     )
     config.load_from_dir(source_dir)
-    contents = load_content(
+    return load_content(
         structure_file=structure_file, source_dir=source_dir / CONTENT_FOLDER
     )
+
+
+def watch_preview(contents, builder, source_dir, interval=0.2, **kwargs):
+    """Updates the preview when project files change.
+    The dataset, the templates and the build cache stay loaded, so after
+    editing a chapter only that chapter is rendered again."""
+    state = _watched_files(source_dir)
+    log.info("Watching for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(interval)
+            new_state = _watched_files(source_dir)
+            changed = sorted(
+                path
+                for path in state.keys() | new_state.keys()
+                if state.get(path) != new_state.get(path)
+            )
+            state = new_state
+            if not changed:
+                continue
+            pld_dir = str(source_dir / PLD_DIR) + os.sep
+            if any(path.startswith(pld_dir) for path in changed):
+                invalidate_templates()
+            start = time.perf_counter()
+            log.info(f"Changed: {', '.join(changed)}")
+            try:
+                new_contents = _load_preview_content(source_dir)
+                parts = [
+                    part_id
+                    for part_id, part in new_contents.items()
+                    if contents.get(part_id, {}).get("content") != part["content"]
+                ]
+                if parts:
+                    log.info(f"Updating {', '.join(parts)}")
+                contents = new_contents
+                create_output(
+                    contents, formats=[builder.name], source_dir=source_dir, **kwargs
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                log.error(f"Could not update preview: {e}")
+                continue
+            builder.reload_preview()
+            log.info(f"Updated preview in {time.perf_counter() - start:.2f}s")
+    except KeyboardInterrupt:
+        log.info("Stopped preview")
+
+
+def preview(dataset, source_dir, output_dir, builder, refresh=True, **kwargs):
+    log.info("Rendering preview")
+    source_dir = Path(source_dir)
+    contents = _load_preview_content(source_dir)
     kwargs["dataset"] = dataset
-    kwargs["source_dir"] = source_dir
     kwargs["output_dir"] = output_dir
-
+    create_output(contents, formats=[builder.name], source_dir=source_dir, **kwargs)
+    server = builder.run_preview()
     if refresh:
-        wkwargs = kwargs.copy()
-        wkwargs["builder"] = builder
-        reloader = hupper.start_reloader(
-            "lingdocs.output.preview", worker_kwargs=wkwargs
-        )
-        reloader.watch_files(watchfiles)
-    create_output(contents, formats=[builder.name], **kwargs)
-    kwargs["contents"] = contents
-    builder.run_preview()
+        watch_preview(contents, builder, source_dir, **kwargs)
+    elif server:
+        server.join()
 
 
 def clean_output(output_dir):
@@ -155,35 +176,218 @@ def _write_file(part_id):
     log.debug(f"Writing {part_id}")
 
 
+CITATION_PATTERN = re.compile(r"[A-Za-z0-9]+(\[[^\]]*])?")
+
+
+def _embedded_files(command, source_dir):
+    """The text of manual examples and tables inserted by a command."""
+    if command.key == "table":
+        path = source_dir / TABLE_DIR / f"{command.url}.csv"
+        if path.is_file():
+            yield path.read_text(encoding="utf-8")
+    elif command.key == "manex":
+        yaml_path = source_dir / MANEX_DIR / f"{command.url}.yaml"
+        if yaml_path.is_file():
+            for mex in load(yaml_path) or []:
+                if mex.startswith("ex:"):
+                    yield f"[ex]({mex.split(':', 1)[1]})"
+                else:
+                    yield from _embedded_files(Command("", "manex", mex), source_dir)
+        path = source_dir / MANEX_DIR / f"{command.url}.md"
+        if path.is_file():
+            yield path.read_text(encoding="utf-8")
+
+
+def find_missing_ids(contents, dataset, source_dir="."):
+    """Checks the IDs in data and citation commands against the dataset.
+    Commands in inserted manual examples and tables are reported at the position
+    of the inserting command.
+
+    Yields:
+        tuple: file name, line, column, table and ID of every missing ID
+    """
+    source_dir = Path(source_dir)
+    data_index = dataset_index(dataset)
+    model_tables = {model.shortcut: model.cldf_table for model in models}
+    source_ids = data_index.memo(
+        "source_ids", lambda: {source.id for source in dataset.sources}
+    )
+
+    def check(md, filename, position=None):
+        for command, line, column in locate(md):
+            if position:
+                line, column = position
+            url_column = column + len(command.key) + 3  # [key](
+            if command.key in model_tables:
+                table = model_tables[command.key]
+                ids = data_index.table(table) if table in data_index else {}
+                offset = 0
+                for rid in command.arguments[0].split(","):
+                    if rid.strip() not in ids:
+                        yield filename, line, url_column + offset, table, rid.strip()
+                    offset += len(rid) + 1
+            elif command.key in ["src", "psrc"]:
+                for m in CITATION_PATTERN.finditer(command.arguments[0]):
+                    bibkey, _ = split_ref(m.group(0))
+                    if bibkey not in source_ids:
+                        yield filename, line, url_column + m.start(), "Source", bibkey
+            elif command.key in ["manex", "table"]:
+                for text in _embedded_files(command, source_dir):
+                    yield from check(text, filename, position or (line, column))
+
+    for part_id, part in contents.items():
+        yield from check(part["content"], part.get("filename", part_id))
+
+
 def check_ids(contents, dataset, source_dir):
-    builder = builders["plain"]()
+    """Logs every missing ID with its location.
+
+    Returns:
+        bool: whether missing IDs were found
+    """
     found = False
-    for filename, x in contents.items():
-        preprocessed = preprocess(x["content"], source_dir)
-        preprocessed = builder.preprocess_commands(preprocessed)
-        figure_metadata = load_figure_metadata(source_dir)
-        builder.figure_metadata = figure_metadata
-        for i, line in enumerate(preprocessed.split("\n")):
-            try:
-                render_markdown(line, dataset, builder=builder)
-            except KeyError as e:
-                log.error(f"Missing ID in file {filename}, L{i+1}:\n{str(e)} in {line}")
-                found = True
+    for filename, line, column, table, rid in find_missing_ids(
+        contents, dataset, source_dir
+    ):
+        log.error(f"{filename}:{line}:{column}: missing ID '{rid}' in {table}")
+        found = True
     if not found:
         log.info("No missing IDs found.")
+    return found
+
+
+DETAIL_DELIM = "DATA-DELIM"
+
+
+def _detail_functions(builder, dataset):
+    """Sets up the template functions for detail pages."""
+    data_index = dataset_index(dataset)
+    audio_dict = data_index.memo("audio", lambda: _audio_dict(dataset))
+    func_dict["get_audio"] = lambda x: builder.get_audio(audio_dict, x)
+    func_dict["index"] = data_index
+    func_dict["decorate_gloss_string"] = builder.decorate_gloss_string
+    func_dict["ref_labels"] = builder.ref_labels
+    func_dict["table_label"] = table_label
+    func_dict["example_links"] = config["examples"].get("custom_links", [])
+    if config["data"]["rich"]:
+        func_dict["data"] = data_index.memo(
+            "rich_orm", lambda: CLDFDataset(dataset, orm=True)
+        )
+
+
+def render_details(builder, dataset, name, label, rids):
+    """Renders the detail pages for some records of a table.
+
+    Args:
+        name (str): The table name used in templates.
+        label (str): The name of the table folder.
+        rids (list): The IDs of the records.
+
+    Returns:
+        list: The page contents, in the order of ``rids``.
+    """
+    loader = loaders[builder.name]["data"]
+    # when in detail mode and listing examples, load the in-text example view (instead of linking))
+    if label != "examples":
+        loader = loaders[builder.name]["example_in_detail"]
+    detail_text = DETAIL_DELIM.join([f"[]({name}#cldf:{rid})" for rid in rids])
+    detail_text = render_cldf(
+        preprocess_cldfviz(detail_text), dataset, loader, func_dict
+    )  # todo prettify
+    if "#cldf" in detail_text:
+        detail_text = render_cldf(
+            detail_text, dataset, loaders[builder.name]["text"], func_dict
+        )
+    detail_texts = builder.preprocess(detail_text).split(DETAIL_DELIM)
+    if len(detail_texts) != len(rids):
+        raise ValueError(f"Could not split rendered {name} details")
+    return detail_texts
+
+
+_detail_worker = {}
+
+
+def _init_detail_worker(builder_name, dataset, config_data, ref_labels):
+    config.data = config_data
+    builder = builders[builder_name]()
+    builder.ref_labels = ref_labels
+    _load_templates(builder)
+    _detail_functions(builder, dataset)
+    _detail_worker.update({"builder": builder, "dataset": dataset})
+
+
+def _render_details_worker(name, label, rids):
+    return render_details(
+        _detail_worker["builder"], _detail_worker["dataset"], name, label, rids
+    )
+
+
+# copies of the rendered pages held while a chunk is rendered and split
+PAGE_COPIES = 4
+
+
+def _detail_chunks(builder, dataset, name, label, rids, executor=None, jobs=1):
+    """Renders the detail pages in chunks of at most ``data.chunk_size`` records.
+    With a ``data.memory`` limit, chunks are made smaller so that the pages of all
+    chunks being rendered fit into it, based on the sizes of the pages so far.
+
+    Yields:
+        tuple: IDs and page contents of a chunk, as soon as it is rendered
+    """
+    size = config["data"].get("chunk_size") or len(rids) or 1
+    limit = (config["data"].get("memory") or 0) * 2**20
+    position = 0
+    pages, page_bytes = 0, 0
+
+    def next_chunk():
+        nonlocal position
+        count = size
+        if limit and pages:
+            count = int(limit * pages / (PAGE_COPIES * jobs * page_bytes))
+            count = max(1, min(size, count))
+        position += count
+        return rids[position - count : position]
+
+    def measure(chunk_pages):
+        nonlocal pages, page_bytes
+        pages += len(chunk_pages)
+        page_bytes += sum(sys.getsizeof(page) for page in chunk_pages)
+
+    if executor is None:
+        while position < len(rids):
+            chunk = next_chunk()
+            chunk_pages = render_details(builder, dataset, name, label, chunk)
+            measure(chunk_pages)
+            yield chunk, chunk_pages
+        return
+    running = {}
+    while position < len(rids) or running:
+        while position < len(rids) and len(running) < jobs:
+            chunk = next_chunk()
+            running[executor.submit(_render_details_worker, name, label, chunk)] = chunk
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk_pages = future.result()
+            measure(chunk_pages)
+            yield running.pop(future), chunk_pages
+
+
+def stream_details(builder, dataset, name, label, rids, executor=None, jobs=1):
+    """Yields the ID and content of every detail page, rendering the pages in chunks
+    (see :func:`_detail_chunks`). Only the pages of the current chunks are kept."""
+    for chunk, chunk_pages in _detail_chunks(
+        builder, dataset, name, label, rids, executor, jobs
+    ):
+        yield from zip(chunk, chunk_pages)
 
 
 def write_details(builder, output_dir, dataset, content):
     if builder.name not in ["mkdocs"]:
         return None
-    loader = loaders[builder.name]["data"]
-    text_loader = loaders[builder.name]["text"]
+    _load_templates(builder)
     data_dir = output_dir / builder.name / builder.data_dir
     data_dir.mkdir(exist_ok=True, parents=True)
-    func_dict["decorate_gloss_string"] = builder.decorate_gloss_string
-    func_dict["ref_labels"] = builder.ref_labels
-    func_dict["table_label"] = table_label
-    func_dict["example_links"] = config["examples"]["custom_links"]
+    _detail_functions(builder, dataset)
     log.info(
         f"Writing data for {builder.name} to {output_dir.resolve()}, this may take a while. Set Set\ndata:\n  data:\n    false\n in your config file to turn off."
     )
@@ -191,14 +395,36 @@ def write_details(builder, output_dir, dataset, content):
         log.info(
             f"Rich data, too! Set\ndata:\n  rich:\n    false\nin your config file to turn off."
         )
-        data = CLDFDataset(dataset, orm=True)
-        func_dict["data"] = data
-        table_list = list((k, v, v.name) for k, v in data.tables.items())
+        table_list = [(k, v, v.name) for k, v in func_dict["data"].tables.items()]
     else:
         table_list = [
             (str(table.url).replace(".csv", ""), table, get_table_name(table))
             for table in dataset.tables
         ]
+    jobs = config["data"].get("jobs", 1) or os.cpu_count()
+    executor = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_detail_worker,
+            initargs=(builder.name, dataset, config.data, builder.ref_labels),
+        )
+    try:
+        _write_tables(
+            builder, output_dir, dataset, content, table_list, data_dir, executor, jobs
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _write_tables(
+    builder, output_dir, dataset, content, table_list, data_dir, executor, jobs
+):  # pylint: disable=too-many-arguments
+    data_index = dataset_index(dataset)
+    loader = loaders[builder.name]["data"]
+    text_loader = loaders[builder.name]["text"]
+    files = OutputFiles()
     model_index = []
     data_nav = ["nav:"]
     for label, table, name in tqdm(table_list):
@@ -216,83 +442,305 @@ def write_details(builder, output_dir, dataset, content):
             index = ""
             if not config["data"]["light"]:
                 index = f"[]({name}#cldf:__all__)"
-                index = render(
-                    doc="".join(preprocess_cldfviz(index)),
-                    cldf_dict=dataset,
-                    loader=loader,
-                    func_dict=func_dict,
+                index = render_cldf(
+                    preprocess_cldfviz(index),
+                    dataset,
+                    loader,
+                    func_dict,
                 )  # todo prettify
                 if "#cldf" in index:
-                    index = render(
-                        doc=index,
-                        cldf_dict=dataset,
-                        loader=text_loader,
-                        func_dict=func_dict,
+                    index = render_cldf(
+                        index,
+                        dataset,
+                        text_loader,
+                        func_dict,
                     )
                 index = builder.preprocess(index)
             if index.strip() != "":
-                if label == "topics":
-                    dump(
-                        index,
-                        output_dir
-                        / builder.name
-                        / builder.topic_dir
-                        / f"index.{builder.file_ext}",
-                    )
-                else:
-                    dump(index, table_dir / f"index.{builder.file_ext}")
+                files.write(index, table_dir / f"index.{builder.file_ext}")
 
         if f"{name}_detail.md" not in loader.list_templates():
             log.warning(f"Not writing details for {name}")
         else:
             table_dir.mkdir(exist_ok=True, parents=True)
-            detail_loader = loader
-            # when in detail mode and listing examples, load the in-text example view (instead of linking))
-            if label != "examples":
-                detail_loader = loaders[builder.name]["example_in_detail"]
-            if name.endswith("Table"):
-                details = {
-                    rec.id: f"[]({name}#cldf:{rec.id})" for rec in dataset.objects(name)
-                }
-            else:
-                details = {
-                    rec["ID"]: f"[]({name}#cldf:{rec['ID']})"
-                    for rec in dataset.iter_rows(name)
-                }
-            delim = "DATA-DELIM"
-            if name != "constructions.csv":
-                details = {
-                    rid: d
-                    for rid, d in details.items()
-                    if not (config["data"]["light"] and rid not in content)
-                }
-            preprocessed = "".join(preprocess_cldfviz(delim.join(details.values())))
-            detail_text = render(
-                doc=preprocessed,
-                cldf_dict=dataset,
-                loader=detail_loader,
-                func_dict=func_dict,
-            )  # todo prettify
-            if "#cldf" in detail_text:
-                detail_text = render(
-                    doc=detail_text,
-                    cldf_dict=dataset,
-                    loader=text_loader,
-                    func_dict=func_dict,
-                )
-            detail_texts = builder.preprocess(detail_text).split(delim)
-            for (rid, detail), content in tqdm(
-                zip(details.items(), detail_texts), desc=name
+            rids = data_index.ids(name)
+            pages = [f"index.{builder.file_ext}"]
+            if name != "constructions.csv" and config["data"]["light"]:
+                rids = [rid for rid in rids if rid in content]
+            for rid, detail in tqdm(
+                stream_details(builder, dataset, name, label, rids, executor, jobs),
+                total=len(rids),
+                desc=name,
             ):
-                filepath = table_dir / f"{rid}.{builder.file_ext}"
-                if content.strip() != "":
-                    dump(content, filepath)
+                if detail.strip() != "":
+                    pages.append(f"{rid}.{builder.file_ext}")
+                    files.write(detail, table_dir / pages[-1])
+            # pages of records that were removed or are no longer included
+            files.remove_orphans(table_dir, pages, f"*.{builder.file_ext}")
     if model_index:
-        dump(
+        files.write(
             "# Data\n\n" + "\n".join(model_index),
             data_dir / f"index.{builder.file_ext}",
         )
-        dump("\n".join(data_nav), data_dir / ".pages")
+        files.write("\n".join(data_nav), data_dir / ".pages")
+    log.info(f"Data pages for {builder.name}: {files}")
+
+
+PART_DELIM = "\n\nLINGDOCS_PART_DELIM\n\n"
+
+
+def render_parts(
+    document,
+    dataset,
+    builder,
+    cache,
+    cache_key,
+    **kwargs,
+):  # pylint: disable=too-many-arguments
+    """Preprocess and render the content parts of a document.
+    Parts whose content is unchanged since the last build are taken from the cache,
+    all others are rendered together in a single pass.
+
+    Returns:
+        tuple: the preprocessed and the rendered document
+    """
+    parts = document.contents
+    results = {}
+    dirty = {}
+    for part_id, part in parts.items():
+        key = fingerprint(cache_key, part["content"])
+        cached = cache.get(builder.name, key)
+        if cached is None:
+            dirty[part_id] = key
+        else:
+            results[part_id] = cached
+    if dirty:
+        log.debug(f"Rendering {len(dirty)}/{len(parts)} parts for {builder.name}")
+        doc = join([document.parsed[part_id] for part_id in dirty], PART_DELIM)
+        with profiler.stage("preprocess"):
+            preprocessed = preprocess(doc, document.source_dir, document=document)
+        with profiler.stage("preprocess_commands"):
+            preprocessed = builder.preprocess_commands(preprocessed, **kwargs)
+        with profiler.stage("render_markdown"):
+            rendered = render_markdown(
+                preprocessed,
+                dataset,
+                builder,
+                decorate_gloss_string=builder.decorate_gloss_string,
+                **kwargs,
+            )
+        preprocessed = preprocessed.split(PART_DELIM)
+        rendered = rendered.split(PART_DELIM)
+        if not len(preprocessed) == len(rendered) == len(dirty):
+            raise ValueError(f"Could not split rendered {builder.name} content")
+        for (part_id, key), pre, ren in zip(dirty.items(), preprocessed, rendered):
+            results[part_id] = {"preprocessed": pre, "rendered": ren}
+            cache.set(builder.name, key, results[part_id])
+    return (
+        "\n\n".join([results[part_id]["preprocessed"] for part_id in parts]),
+        "\n\n".join([results[part_id]["rendered"] for part_id in parts]),
+    )
+
+
+def build_format(output_format, *args, **kwargs):
+    """Write a single output format. Used by :func:`create_output`."""
+    gloss_cache = gloss_cache_stats()
+    with profiler.format(output_format), profiler.stage("total"):
+        _build_format(output_format, *args, **kwargs)
+    with profiler.format(output_format):
+        for key in ["hits", "misses"]:
+            profiler.count(
+                f"gloss cache {key}", gloss_cache_stats()[key] - gloss_cache[key]
+            )
+
+
+def _build_format(
+    output_format,
+    document,
+    dataset,
+    output_dir,
+    metadata,
+    build_key,
+    progress=True,
+    **kwargs,
+):  # pylint: disable=too-many-arguments
+    cache = BuildCache(output_dir / CACHE_DIR, enabled=config["output"]["cache"])
+    builder = builders[output_format]()
+    with tqdm(
+        total=6,
+        desc=f"Writing {output_format} to {(output_dir / builder.name)}",
+        disable=not progress,
+    ) as pbar:
+        source_dir = document.source_dir
+        builder.figure_metadata = document.figure_metadata
+        builder.ref_labels = document.ref_labels
+        builder.ref_locations = document.ref_locations
+        pbar.update(1)
+        format_key = fingerprint(build_key, output_format)
+        builder.cache = cache
+        builder.cache_key = format_key
+        preprocessed, content = render_parts(
+            document,
+            dataset,
+            builder,
+            cache=cache,
+            cache_key=format_key,
+            **kwargs,
+        )
+        pbar.update(1)
+        content += "\n\n" + builder.reference_list()
+        # second run to insert reference list
+        pbar.update(1)
+        content = cache.memoize(
+            builder.name,
+            fingerprint(format_key, "references", content),
+            profiler.stage("render references")(
+                lambda: render_markdown(
+                    content,
+                    dataset,
+                    builder,
+                    decorate_gloss_string=builder.decorate_gloss_string,
+                    output_format=output_format,
+                    **kwargs,
+                )
+            ),
+        )
+        pbar.update(1)
+        content = cache.memoize(
+            builder.name,
+            fingerprint(format_key, "postprocess", content),
+            profiler.stage("postprocess")(
+                lambda: postprocess(
+                    content, dataset, builder, source_dir, document=document
+                )
+            ),
+        )
+        pbar.update(1)
+        if builder.name == "latex":
+            metadata["bibfile"] = dataset.bibpath.name
+        if builder.single_output:
+            audio_dic = {}
+            if config[builder.name].get("audio"):
+                for x in dataset.iter_rows("MediaTable"):
+                    audio_dic[x["ID"]] = x
+            with profiler.stage("write_folder"):
+                builder.write_folder(
+                    output_dir,
+                    source_dir=source_dir,
+                    content=content,
+                    metadata=metadata,
+                    abbrev_dict=document.abbrev_dict,
+                    ref_labels=document.ref_labels,
+                    ref_locations=document.ref_locations,
+                    chapters=document.chapters,
+                    audio=audio_dic,
+                )
+            if builder.name == "latex":
+                shutil.copy(
+                    dataset.bibpath,
+                    output_dir / builder.name / dataset.bibpath.name,
+                )
+            # if _compile:
+            #     builder.compile(source_dir, output_dir)
+        pbar.update(1)
+    if config["data"]["data"]:
+        with profiler.stage("write_details"):
+            write_details(builder, output_dir, dataset, preprocessed)
+    if builder.name == "latex":
+        bibcontents = read_file(dataset.bibpath)
+        if bibcontents:
+            write_file(
+                bibcontents.replace(" &", " \\&"),
+                output_dir / builder.name / dataset.bibpath.name,
+            )
+    cache.prune(builder.name)
+    log.debug(f"Gloss decoration cache after {builder.name}: {gloss_cache_stats()}")
+
+
+class BuildFailed(RuntimeError):
+    """One or more formats could not be built."""
+
+
+def _reduce_source(source):
+    return Source, (source.genre, source.id), None, None, iter(source.items())
+
+
+# sources of a dataset are pickled when it is sent to the workers, but Source
+# cannot be rebuilt without its genre and ID
+copyreg.pickle(Source, _reduce_source)
+
+
+class _RecordCollector(logging.Handler):
+    """Keeps log records of a worker process so they can be replayed in order."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+def _build_format_worker(output_format, config_data, kwargs, profile=False):
+    config.data = config_data
+    profiler.reset(enabled=profile)
+    external_calls.reset(budget=config["output"].get("max_processes", 0))
+    pkg_log = logging.getLogger("lingdocs")
+    for handler in pkg_log.handlers[:]:
+        pkg_log.removeHandler(handler)
+    collector = _RecordCollector()
+    pkg_log.addHandler(collector)
+    pkg_log.propagate = False
+    try:
+        build_format(output_format, progress=False, **kwargs)
+    except Exception:  # pylint: disable=broad-exception-caught
+        return collector.records, traceback.format_exc(), profiler.report()
+    return collector.records, None, profiler.report()
+
+
+def _build_parallel(formats, jobs, **kwargs):
+    log.info(f"Building {len(formats)} formats with {jobs} workers")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            output_format: executor.submit(
+                _build_format_worker,
+                output_format,
+                config.data,
+                kwargs,
+                profiler.enabled,
+            )
+            for output_format in formats
+        }
+        results = {}
+        for output_format, future in futures.items():
+            try:
+                results[output_format] = future.result()
+            except Exception:  # pylint: disable=broad-exception-caught
+                results[output_format] = ([], traceback.format_exc(), None)
+    failed = {}
+    for output_format in formats:
+        records, error, report = results[output_format]
+        if report:
+            profiler.merge(report)
+        for record in records:
+            logging.getLogger(record.name).handle(record)
+        if error:
+            failed[output_format] = error
+        else:
+            log.info(f"Wrote {output_format}")
+    if failed:
+        for output_format, error in failed.items():
+            log.error(f"Building {output_format} failed:\n{error}")
+        raise BuildFailed(
+            f"{len(failed)} of {len(formats)} formats failed: {', '.join(failed)}"
+        )
+    # every worker only knows its own calls
+    external_calls.check()
 
 
 def create_output(
@@ -302,19 +750,19 @@ def create_output(
     dataset,
     output_dir,
     metadata=None,
+    jobs=1,
     **kwargs,
 ):  # pylint: disable=too-many-arguments
     """Run different builders.
 
-
-    This is the extended description.
-
     Args:
-        arg1 (int): Description of arg1
-
-    Returns:
-        bool: blabla
-
+        contents (dict): content parts, as returned by `load_content`
+        source_dir: the project folder
+        formats (list): the formats to build
+        dataset: the CLDF dataset
+        output_dir: the folder where output is written
+        metadata (dict): the project metadata
+        jobs (int): the number of formats to build in parallel worker processes
     """
     if isinstance(metadata, (str, PosixPath)):
         metadata = load(metadata) or None
@@ -323,82 +771,37 @@ def create_output(
     if not output_dir.is_dir():
         log.info(f"Creating output folder {output_dir.resolve()}")
         output_dir.mkdir()
-    abbrev_dict = check_abbrevs(
-        dataset, source_dir, "\n\n".join([x["content"] for x in contents.values()])
+    external_calls.reset(budget=config["output"].get("max_processes", 0))
+    document = Document(contents, source_dir, dataset, cache_dir=output_dir / CACHE_DIR)
+    build_key = fingerprint(
+        LINGDOCS_VERSION,
+        dataset_index(dataset).memo(
+            "fingerprint", lambda: dataset_fingerprint(dataset)
+        ),
+        source_fingerprint(source_dir),
+        document.figure_metadata,
+        document.ref_labels,
+        document.ref_locations,
+        config.data,
+        kwargs,
     )
-
-    figure_metadata = load_figure_metadata(source_dir)
+    known_formats = []
     for output_format in formats:
         if output_format not in builders:
             log.warning(f"Unknown output format '{output_format}'.")
-            continue
-        builder = builders[output_format]()
-        with tqdm(
-            total=6, desc=f"Writing {output_format} to {(output_dir / builder.name)}"
-        ) as pbar:
-            builder.figure_metadata = figure_metadata
-            content = "\n\n".join([x["content"] for x in contents.values()])
-            pbar.update(1)
-            chapters = extract_chapters(content)
-            ref_labels, ref_locations = process_labels(chapters)
-            preprocessed = preprocess(content, dataset, builder, source_dir)
-            builder.ref_labels = ref_labels
-            builder.ref_locations = ref_locations
-            preprocessed = builder.preprocess_commands(preprocessed, **kwargs)
-            content = render_markdown(
-                preprocessed,
-                dataset,
-                builder,
-                decorate_gloss_string=builder.decorate_gloss_string,
-                **kwargs,
-            )
-            pbar.update(1)
-            content += "\n\n" + builder.reference_list()
-            # second run to insert reference list
-            pbar.update(1)
-            content = render_markdown(
-                content,
-                dataset,
-                builder,
-                decorate_gloss_string=builder.decorate_gloss_string,
-                output_format=output_format,
-                **kwargs,
-            )
-            pbar.update(1)
-            content = postprocess(content, dataset, builder, source_dir)
-            pbar.update(1)
-            if builder.name == "latex":
-                metadata["bibfile"] = dataset.bibpath.name
-            if builder.single_output:
-                audio_dic = {}
-                if config[builder.name].get("audio"):
-                    for x in dataset.iter_rows("MediaTable"):
-                        audio_dic[x["ID"]] = x
-                builder.write_folder(
-                    output_dir,
-                    source_dir=source_dir,
-                    content=content,
-                    metadata=metadata,
-                    abbrev_dict=abbrev_dict,
-                    ref_labels=ref_labels,
-                    ref_locations=ref_locations,
-                    chapters=chapters,
-                    audio=audio_dic,
-                )
-                if builder.name == "latex":
-                    shutil.copy(
-                        dataset.bibpath,
-                        output_dir / builder.name / dataset.bibpath.name,
-                    )
-                # if _compile:
-                #     builder.compile(source_dir, output_dir)
-            pbar.update(1)
-        if config["data"]["data"]:
-            write_details(builder, output_dir, dataset, preprocessed)
-        if builder.name == "latex":
-            bibcontents = read_file(dataset.bibpath)
-            if bibcontents:
-                write_file(
-                    bibcontents.replace(" &", " \\&"),
-                    output_dir / builder.name / dataset.bibpath.name,
-                )
+        else:
+            known_formats.append(output_format)
+    build_kwargs = {
+        "document": document,
+        "dataset": dataset,
+        "output_dir": output_dir,
+        "metadata": metadata,
+        "build_key": build_key,
+        **kwargs,
+    }
+    jobs = jobs or os.cpu_count()
+    if jobs > 1 and len(known_formats) > 1:
+        _build_parallel(known_formats, min(jobs, len(known_formats)), **build_kwargs)
+    else:
+        for output_format in known_formats:
+            build_format(output_format, **build_kwargs)
@@ -0,0 +1,125 @@
+"""Conversion of markdown with pandoc.
+Every call to pandoc starts a new process, so small fragments like table cells
+and captions are collected by the :data:`broker` and converted together."""
+import logging
+import re
+
+import panflute
+
+from lingdocs.external import external_calls
+from lingdocs.profiling import profiler
+
+log = logging.getLogger(__name__)
+
+DELIM = "LINGDOCSPANDOCSPLIT"
+# the delimiter paragraph as rendered in the different output formats
+DELIM_PATTERN = re.compile(r"\n*^(?:<p>)?LINGDOCSPANDOCSPLIT(?:</p>)?$\n*", re.M)
+PLACEHOLDER_PATTERN = re.compile(r"LINGDOCSPANDOC(\d+)X")
+# footnotes and headings are numbered or identified across the whole document
+ISOLATE_PATTERN = re.compile(r"\[\^|^#", re.M)
+
+
+def convert_text(text, output_format, input_format="markdown", extra_args=None):
+    """Convert a single text, using one pandoc process."""
+    with profiler.stage("pandoc"), external_calls.call("pandoc"):
+        return panflute.convert_text(
+            text,
+            input_format=input_format,
+            output_format=output_format,
+            extra_args=list(extra_args or []),
+        )
+
+
+def convert_batch(texts, output_format, input_format="markdown", extra_args=None):
+    """Convert a list of texts, using one pandoc process for all of them.
+
+    Returns:
+        list: the converted texts, in the same order
+    """
+    texts = list(texts)
+    results = [None] * len(texts)
+    batch = []
+    for i, text in enumerate(texts):
+        if DELIM in text or ISOLATE_PATTERN.search(text):
+            results[i] = convert_text(text, output_format, input_format, extra_args)
+        else:
+            batch.append(i)
+    if len(batch) == 1:
+        results[batch[0]] = convert_text(
+            texts[batch[0]], output_format, input_format, extra_args
+        )
+    elif batch:
+        converted = DELIM_PATTERN.split(
+            convert_text(
+                f"\n\n{DELIM}\n\n".join([texts[i] for i in batch]),
+                output_format,
+                input_format,
+                extra_args,
+            )
+        )
+        if len(converted) != len(batch):
+            log.debug(f"Could not split {output_format} batch, converting one by one")
+            converted = [
+                convert_text(texts[i], output_format, input_format, extra_args)
+                for i in batch
+            ]
+        for i, result in zip(batch, converted):
+            results[i] = result
+    return results
+
+
+class PandocBroker:
+    """Collects texts to be converted and hands out placeholders for them.
+    :meth:`resolve` converts all collected texts with one pandoc call per
+    combination of formats and arguments and inserts the results."""
+
+    def __init__(self):
+        self.pending = {}
+        self.counter = 0
+
+    def submit(
+        self, text, output_format, input_format="markdown", extra_args=None, then=None
+    ):
+        """Schedule a conversion.
+
+        Args:
+            text (str): The text to convert.
+            output_format (str): The pandoc output format.
+            input_format (str): The pandoc input format.
+            extra_args (list): Additional pandoc arguments.
+            then (callable): Applied to the converted text.
+
+        Returns:
+            str: A placeholder to be replaced by :meth:`resolve`.
+        """
+        self.counter += 1
+        key = (output_format, input_format, tuple(extra_args or []))
+        self.pending[self.counter] = (key, text, then)
+        return f"LINGDOCSPANDOC{self.counter}X"
+
+    def resolve(self, content):
+        """Convert all pending texts and replace their placeholders in content."""
+        if not self.pending:
+            return content
+        groups = {}
+        for number, (key, text, then) in self.pending.items():
+            groups.setdefault(key, []).append(number)
+        results = {}
+        for (output_format, input_format, extra_args), numbers in groups.items():
+            log.debug(f"Converting {len(numbers)} fragments to {output_format}")
+            converted = convert_batch(
+                [self.pending[number][1] for number in numbers],
+                output_format,
+                input_format,
+                extra_args,
+            )
+            for number, result in zip(numbers, converted):
+                then = self.pending[number][2]
+                results[str(number)] = then(result) if then else result
+        self.pending = {}
+        return PLACEHOLDER_PATTERN.sub(
+            lambda m: results.get(m.group(1), m.group(0)), content
+        )
+
+
+broker = PandocBroker()
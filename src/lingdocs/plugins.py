@@ -0,0 +1,123 @@
+"""Registries of output formats and models.
+Besides the built-in ones, formats and models can come from installed packages,
+through the entry point groups ``lingdocs.formats`` and ``lingdocs.models``,
+or from ``pld/formats.py`` and ``pld/models.py`` in the project folder.
+Entry points and project files are only loaded when a format or model is
+looked up, and project files are found relative to the project folder
+(``config["source"]``), not the working directory."""
+import importlib.util
+import logging
+import os
+from collections.abc import Mapping, Sequence
+from importlib.metadata import entry_points
+from pathlib import Path
+
+from lingdocs.config import PLD_DIR, config
+
+log = logging.getLogger(__name__)
+
+
+def _entry_points(group):
+    found = entry_points()
+    if hasattr(found, "select"):
+        return found.select(group=group)
+    return found.get(group, [])  # Python < 3.10
+
+
+def _load_module(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Registry(Mapping):
+    """Classes by name. Later sources replace earlier ones with the same name:
+
+    1. the built-in classes
+    2. entry points in the group ``lingdocs.<kind>s``; the entry point name
+       should be the ``name`` of the class
+    3. the list ``<kind>s`` in ``pld/<kind>s.py`` in the project folder
+
+    Args:
+        kind (str): ``format`` or ``model``.
+        builtins (dict): The built-in classes by name.
+    """
+
+    def __init__(self, kind, builtins):
+        self.kind = kind
+        self.builtins = builtins
+        self.loaded = {}
+        self._entry_points = None
+        self._local = {}
+
+    def entry_points(self):
+        if self._entry_points is None:
+            self._entry_points = {
+                ep.name: ep for ep in _entry_points(f"lingdocs.{self.kind}s")
+            }
+        return self._entry_points
+
+    def project(self):
+        """The absolute path of the project folder, without touching the file system."""
+        return os.path.abspath(config.data.get("source", "."))
+
+    def local(self):
+        """The classes from the project folder, loaded once per project."""
+        project = self.project()
+        if project not in self._local:
+            self._local[project] = {}
+            path = (Path(project) / PLD_DIR / f"{self.kind}s.py").resolve()
+            if path.is_file():
+                module = _load_module(path, f"lingdocs_pld_{self.kind}s")
+                for cls in getattr(module, f"{self.kind}s"):
+                    log.info(f"Using custom {self.kind} {cls.name.lower()}")
+                    self._local[project][cls.name] = cls
+        return self._local[project]
+
+    def __getitem__(self, name):
+        local = self.local()
+        if name in local:
+            return local[name]
+        if name not in self.loaded:
+            if name in self.entry_points():
+                self.loaded[name] = self.entry_points()[name].load()
+            elif name in self.builtins:
+                self.loaded[name] = self.builtins[name]
+            else:
+                raise KeyError(name)
+        return self.loaded[name]
+
+    def __iter__(self):
+        return iter(
+            dict.fromkeys([*self.builtins, *self.entry_points(), *self.local()])
+        )
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+class Instances(Sequence):
+    """Instances of all classes in a :class:`Registry`, created on first use
+    and again for every new project folder."""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.project = None
+        self.instances = []
+
+    def _instances(self):
+        project = self.registry.project()
+        if project != self.project:
+            self.project = project
+            self.instances = [cls() for cls in self.registry.values()]
+        return self.instances
+
+    def __getitem__(self, index):
+        return self._instances()[index]
+
+    def __len__(self):
+        return len(self._instances())
+
+    def __iter__(self):
+        return iter(self._instances())
@@ -6,6 +6,7 @@ import pandas as pd
 from writio import load
 
 from lingdocs.io import load_table_metadata
+from lingdocs.pandoc import broker
 from lingdocs.preprocessing import process_metadata
 
 log = logging.getLogger(__name__)
@@ -75,12 +76,16 @@ def insert_tables(md, builder, tables):
     yield md[current:]
 
 
-def postprocess(md_str, dataset, builder, source_dir="."):
-    tables = process_metadata(load_table_metadata(source_dir), dataset, builder)
+def postprocess(md_str, dataset, builder, source_dir=".", document=None):
+    if document is None:
+        table_metadata = load_table_metadata(source_dir)
+    else:
+        table_metadata = document.table_metadata_copy()
+    tables = process_metadata(table_metadata, dataset, builder)
     md_str = "".join(insert_manex(md_str, builder, MANPEX_PATTERN, kind="multipart"))
     md_str = "".join(
         insert_manex(md_str, builder, MANPEX_ITEM_PATTERN, kind="subexample")
     )
     md_str = "".join(insert_manex(md_str, builder, MANEX_PATTERN))
-    md_str = "".join(insert_tables(md_str, builder, tables))
+    md_str = broker.resolve("".join(insert_tables(md_str, builder, tables)))
     return builder.postprocess(md_str, load(source_dir / "metadata.yaml"))
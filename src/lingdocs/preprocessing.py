@@ -1,42 +1,53 @@
 import logging
+import re
 import sys
+from functools import partial
 from io import StringIO
 from pathlib import Path
 
 import pandas as pd
 import yaml
 from cldf_rel import CLDFDataset
-from cldfviz.text import render
-from jinja2 import DictLoader
+from cldfviz.text import TemplateRenderer, get_env, pad_ex, source_markdown
+from jinja2 import ChoiceLoader, DictLoader, Environment, FileSystemBytecodeCache
 from writio import load
 
+from lingdocs.commands import expand
 from lingdocs.config import (
     DATA_DIR,
     MANEX_DIR,
-    MD_LINK_PATTERN,
     PLD_DIR,
     TABLE_DIR,
     config,
 )
-from lingdocs.helpers import comma_and_list, func_dict, get_md_pattern
+from lingdocs.helpers import comma_and_list, func_dict
+from lingdocs.index import dataset_index
 from lingdocs.io import load_table_metadata
 from lingdocs.models import models
-from lingdocs.templates import load_templates
+from lingdocs.profiling import profiler
+from lingdocs.templates import load_templates, template_index
 
 log = logging.getLogger(__name__)
 
-tables = {}
-for model in models:
-    tables[model.shortcut] = {
-        "query": model.query_string,
-        "label": model.name.lower() + "s",
-    }
-
 log.debug("Loading templates")
 loaders = {}
 
 
+_loader_keys = {}
+_environments = {}
+
+
 def _load_templates(builder, rich=None):
+    """Create the template loaders for a builder.
+    They are reused until the builder, the richness, the interlinear setting
+    or the template index changes."""
+    rich = rich or config["data"]["rich"]
+    key = (rich, config["latex"]["interlinear"], template_index().version)
+    if builder.name in loaders and _loader_keys.get(builder.name) == key:
+        return
+    for loader in loaders.get(builder.name, {}).values():
+        _environments.pop(loader, None)
+    _loader_keys[builder.name] = key
     templates = load_templates(builder, models, rich=rich)
     pld_util = load(DATA_DIR / "util.j2")
 
@@ -77,43 +88,153 @@ def _load_templates(builder, rich=None):
     }
 
 
+def get_environment(loader):
+    """The jinja environment for a template loader.
+    Environments are shared so templates are only compiled once per process;
+    compiled templates are also kept in a bytecode cache shared by processes."""
+    if loader not in _environments:
+        fallback = get_env()
+        env = Environment(
+            loader=ChoiceLoader([loader, fallback.loader]),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            bytecode_cache=FileSystemBytecodeCache(),
+        )
+        env.filters.update(fallback.filters)
+        _environments[loader] = env
+    return _environments[loader]
+
+
+def render_cldf(doc, ds, loader, func_dict):
+    """Like :func:`cldfviz.text.render`, but with a shared jinja environment."""
+    func_dict.update(
+        {"pad_ex": partial(pad_ex, escape=True), "source_markdown": source_markdown}
+    )
+    return TemplateRenderer(
+        get_environment(loader), func_dict, doc, {None: ds}
+    ).render()
+
+
 bool_dic = {"True": True, "False": False}
 
 shortcuts = {"ftr": "translation"}
 
 
-def preprocess_cldfviz(md):
-    current = 0
-    for m in MD_LINK_PATTERN.finditer(md):
-        yield md[current : m.start()]
-        current, key, url = get_md_pattern(m)
-        if key in tables:
-            args = []
-            kwargs = {}
-            if "?" in url:
-                url, arguments = url.split("?")
-                for arg in arguments.split("&"):
-                    if "=" in arg:
-                        k, v = arg.split("=")
-                        if k in shortcuts:
-                            k = shortcuts[k]
-                        kwargs[k] = bool_dic.get(v, v)
-                    elif arg == "nt":
-                        kwargs["with_translation"] = False
-                    elif arg == "nl":
-                        kwargs["with_language"] = False
-                    else:
-                        args.append(arg)
-            if "," in url:
-                kwargs.update({"ids": url})
-                yield tables[key]["query"](
-                    url, visualizer="cldfviz", multiple=True, *args, **kwargs
-                )
-            else:
-                yield tables[key]["query"](url, visualizer="cldfviz", *args, **kwargs)
+def _query(command, queries):
+    url, cmd_args, cmd_kwargs = command.arguments
+    args = []
+    kwargs = {}
+    for arg in cmd_args:
+        if arg == "nt":
+            kwargs["with_translation"] = False
+        elif arg == "nl":
+            kwargs["with_language"] = False
         else:
-            yield md[m.start() : m.end()]
-    yield md[current:]
+            args.append(arg)
+    for k, v in cmd_kwargs.items():
+        kwargs[shortcuts.get(k, k)] = bool_dic.get(v, v)
+    query = queries[command.key]
+    if "," in url:
+        kwargs.update({"ids": url})
+        return query(url, visualizer="cldfviz", multiple=True, *args, **kwargs)
+    return query(url, visualizer="cldfviz", *args, **kwargs)
+
+
+def preprocess_cldfviz(md):
+    """Replaces data commands like ``[ex](id)`` with cldfviz references."""
+    queries = {model.shortcut: model.query_string for model in models}
+    return expand(md, {key: partial(_query, queries=queries) for key in queries})
+
+
+FRAGMENT_DELIM = "\n\nLINGDOCS_FRAGMENT_DELIM\n\n"
+SOURCE_LINK_PATTERN = re.compile(r"\]\((#source-[^)]+)\)")
+# the URL fragment of a link to a CLDF object, as recognized by pycldf
+CLDF_LINK_PATTERN = re.compile(r"\]\([^)]*#cldf(-[a-zA-Z0-9_]+)?:")
+
+
+def _cited_stub(fragments):
+    # cldfviz determines the cited references from the rendered text;
+    # a fragment with a reference list needs to see the citations of the whole document
+    links = dict.fromkeys(
+        m.group(1) for f in fragments for m in SOURCE_LINK_PATTERN.finditer(f)
+    )
+    return " ".join(f"[]({link})" for link in links)
+
+
+def resolve_cldf(md_str, ds, loader, func_dict, max_depth=4, full_passes=2):
+    """Render CLDF markdown links until none are left.
+    Templates can produce new CLDF links, so rendering is repeated, but only
+    paragraphs which still contain unresolved links are rendered again.
+    All such paragraphs are rendered together in a single cldfviz call.
+
+    Args:
+        md_str (str): The markdown text.
+        ds (pycldf.Dataset): The dataset the links refer to.
+        loader (jinja2.BaseLoader): The template loader.
+        func_dict (dict): Functions available in templates.
+        max_depth (int): How often nested links are resolved before giving up.
+        full_passes (int): The number of passes with all of ``func_dict``;
+            later passes only resolve links produced by templates, like
+            references, and only get ``comma_and_list``.
+
+    Returns:
+        str: The rendered markdown.
+    """
+    fragments = md_str.split("\n\n")
+    pending = [
+        i for i, fragment in enumerate(fragments) if CLDF_LINK_PATTERN.search(fragment)
+    ]
+    depth = 0
+    while pending and depth < max_depth:
+        depth += 1
+        batch = [fragments[i] for i in pending]
+        stub = ""
+        if any("cited_only" in fragment for fragment in batch):
+            stub = _cited_stub(fragments)
+        # the enclosing lines keep cldfviz from stripping whitespace
+        # or parsing the first fragment as YAML frontmatter
+        with profiler.stage(f"cldf pass {depth}"):
+            rendered = render_cldf(
+                FRAGMENT_DELIM.join(["LINGDOCS_START " + stub, *batch, "LINGDOCS_END"]),
+                ds,
+                loader,
+                (
+                    func_dict
+                    if depth <= full_passes
+                    else {"comma_and_list": comma_and_list}
+                ),
+            ).split(FRAGMENT_DELIM)[1:-1]
+        if len(rendered) != len(batch):
+            raise ValueError("Could not split rendered fragments")
+        log.debug(f"Rendering pass {depth}: {len(batch)}/{len(fragments)} fragments")
+        still_pending = []
+        for i, old, new in zip(pending, batch, rendered):
+            fragments[i] = new
+            if CLDF_LINK_PATTERN.search(new):
+                if new == old:
+                    log.warning(f"Could not resolve CLDF links in:\n{new}")
+                else:
+                    still_pending.append(i)
+        pending = still_pending
+    if pending:
+        log.warning(
+            f"CLDF links still unresolved after {max_depth} rendering passes"
+            f" in {len(pending)} paragraphs, e.g.:\n{fragments[pending[0]]}"
+        )
+    # like cldfviz rendering the whole document, without surrounding whitespace
+    return "\n\n".join(fragments).strip()
+
+
+def _audio_dict(ds):
+    if "MediaTable" not in ds.components:
+        return {}
+    return {
+        x["ID"]: {
+            "url": x.get("Download_URL", "").unsplit(),
+            "type": x["Media_Type"],
+        }
+        for x in dataset_index(ds).rows("MediaTable")
+    }
 
 
 def render_markdown(
@@ -130,52 +251,26 @@ def render_markdown(
     rich = rich or config["data"]["rich"]
     if data_format == "cldf":
         if builder.name != "clld":
-            if "MediaTable" in ds.components:
-                audio_dict = {
-                    x["ID"]: {
-                        "url": x.get("Download_URL", "").unsplit(),
-                        "type": x["Media_Type"],
-                    }
-                    for x in ds.iter_rows("MediaTable")
-                }
-            else:
-                audio_dict = {}
+            index = dataset_index(ds)
+            audio_dict = index.memo("audio", lambda: _audio_dict(ds))
             func_dict["get_audio"] = lambda x: builder.get_audio(audio_dict, x)
             func_dict["decorate_gloss_string"] = decorate_gloss_string
+            func_dict["index"] = index
             for func, val in kwargs.get("func_dict", {}).items():
                 func_dict[func] = val
             func_dict["ref_labels"] = builder.ref_labels
             if rich:
-                data = CLDFDataset(ds)
+                data = index.memo("rich", lambda: CLDFDataset(ds))
                 func_dict["data"] = data.tables
-            preprocessed = render(
-                doc="".join(preprocess_cldfviz(md_str)),
-                cldf_dict=ds,
+            preprocessed = resolve_cldf(
+                preprocess_cldfviz(md_str),
+                ds,
                 loader=loaders[builder.name]["text"],
                 func_dict=func_dict,
+                max_depth=config["output"].get("render_depth", 4),
             )
-            preprocessed = render(
-                doc=preprocessed,
-                cldf_dict=ds,
-                loader=loaders[builder.name]["text"],
-                func_dict=func_dict,
-            )  # todo this can be made prettier
-            if "#cldf" in preprocessed:
-                preprocessed = render(
-                    doc=preprocessed,
-                    cldf_dict=ds,
-                    loader=loaders[builder.name]["text"],
-                    func_dict={"comma_and_list": comma_and_list},
-                )
-            if "#cldf" in preprocessed:
-                preprocessed = render(
-                    doc=preprocessed,
-                    cldf_dict=ds,
-                    loader=loaders[builder.name]["text"],
-                    func_dict={"comma_and_list": comma_and_list},
-                )
         else:
-            preprocessed = "".join(preprocess_cldfviz(md_str))
+            preprocessed = preprocess_cldfviz(md_str)
         return preprocessed
     log.error(f"Unknown data format {data_format}")
     sys.exit()
@@ -189,7 +284,9 @@ def _load_table(table_path):
     return pd.read_csv(table_path, index_col=0, keep_default_na=False)
 
 
-def load_tables(md, tables, source_dir="."):
+def read_table(url, tables, source_dir="."):
+    """Returns the raw table block for a ``[table](url)`` command."""
+
     def decorate_cell(x):
         if x != "":
             return (
@@ -199,80 +296,88 @@ def load_tables(md, tables, source_dir="."):
             )
         return x
 
-    current = 0
-    for m in MD_LINK_PATTERN.finditer(md):
-        yield md[current : m.start()]
-        current, key, url = get_md_pattern(m)
-        if key == "table":
-            this_table_metadata = tables.get(url, {})
-            if "subtables" in this_table_metadata:
-                yield f"\nLINGDOCS_RAW_TABLE_START{url}CONTENT_STARTLINGDOCS_RAW_TABLE_END"
-                for subtable in this_table_metadata["subtables"]:
-                    subtable_md = tables.get(subtable, {})
-                    temp_df = _load_table(source_dir / TABLE_DIR / f"{subtable}.csv")
-                    temp_df = temp_df.map(decorate_cell)
-                    with_header_col = subtable_md.get("header_column", True)
-                    if not with_header_col:
-                        temp_df.index = temp_df.index.map(decorate_cell)
-                    csv_buffer = StringIO()
-                    temp_df.to_csv(csv_buffer, index=True)
-                    csv_buffer.seek(0)
-                    yield f"\nLINGDOCS_RAW_TABLE_START{subtable}CONTENT_START{csv_buffer.read()}LINGDOCS_RAW_TABLE_END"
-            else:
-                temp_df = _load_table(source_dir / TABLE_DIR / f"{url}.csv")
-                temp_df = temp_df.map(decorate_cell)
-                with_header_col = this_table_metadata.get("header_column", True)
-                if not with_header_col:
-                    temp_df.index = temp_df.index.map(decorate_cell)
-                csv_buffer = StringIO()
-                temp_df.to_csv(csv_buffer, index=True)
-                csv_buffer.seek(0)
-                yield f"\nLINGDOCS_RAW_TABLE_START{url}CONTENT_START{csv_buffer.read()}LINGDOCS_RAW_TABLE_END"
-        else:
-            yield md[m.start() : m.end()]
-    yield md[current:]
-
-
-def load_manual_examples(md, source_dir="."):
-    current = 0
-    for m in MD_LINK_PATTERN.finditer(md):
-        yield md[current : m.start()]
-        current, key, url = get_md_pattern(m)
-        if key == "manex":
-            manex__yaml_path = source_dir / MANEX_DIR / f"{url}.yaml"
-            if manex__yaml_path.is_file():
-                with open(manex__yaml_path, encoding="utf-8") as f:
-                    mex_list = yaml.load(f, Loader=yaml.SafeLoader)
-                output = []
-                for mex in mex_list:
-                    if mex.startswith("ex:"):
-                        output.append(f"[ex]({mex.split(':', 1)[1]}?format=subexample)")
-                    else:
-                        manex_md_path = source_dir / MANEX_DIR / f"{mex}.md"
-                        with open(manex_md_path, "r", encoding="utf-8") as f:
-                            output.append(
-                                "LINGDOCS_MANPEXITEM_START"
-                                + mex
-                                + "CONTENT_START"
-                                + f.read()
-                                + "LINGDOCS_MANPEXITEM_END"
-                            )
-                yield "LINGDOCS_MANPEX_START" + url + "CONTENT_START\n" + "\n".join(
-                    output
-                ) + "\nLINGDOCS_MANPEX_END"
+    def raw_table(label, table_metadata):
+        temp_df = _load_table(Path(source_dir) / TABLE_DIR / f"{label}.csv")
+        temp_df = temp_df.map(decorate_cell)
+        with_header_col = table_metadata.get("header_column", True)
+        if not with_header_col:
+            temp_df.index = temp_df.index.map(decorate_cell)
+        csv_buffer = StringIO()
+        temp_df.to_csv(csv_buffer, index=True)
+        csv_buffer.seek(0)
+        return f"\nLINGDOCS_RAW_TABLE_START{label}CONTENT_START{csv_buffer.read()}LINGDOCS_RAW_TABLE_END"
+
+    this_table_metadata = tables.get(url, {})
+    if "subtables" in this_table_metadata:
+        output = [f"\nLINGDOCS_RAW_TABLE_START{url}CONTENT_STARTLINGDOCS_RAW_TABLE_END"]
+        for subtable in this_table_metadata["subtables"]:
+            output.append(raw_table(subtable, tables.get(subtable, {})))
+        return "".join(output)
+    return raw_table(url, this_table_metadata)
+
+
+def load_tables(md, tables, source_dir=".", loaded=None):
+    loaded = loaded or {}
+
+    def table(command):
+        if command.url in loaded:
+            return loaded[command.url]
+        return read_table(command.url, tables, source_dir)
+
+    return expand(md, {"table": table})
+
+
+def read_manual_example(url, source_dir="."):
+    """Returns the raw example block for a ``[manex](url)`` command."""
+    source_dir = Path(source_dir)
+    manex__yaml_path = source_dir / MANEX_DIR / f"{url}.yaml"
+    if manex__yaml_path.is_file():
+        with open(manex__yaml_path, encoding="utf-8") as f:
+            mex_list = yaml.load(f, Loader=yaml.SafeLoader)
+        output = []
+        for mex in mex_list:
+            if mex.startswith("ex:"):
+                output.append(f"[ex]({mex.split(':', 1)[1]}?format=subexample)")
             else:
-                manex_md_path = source_dir / MANEX_DIR / f"{url}.md"
-                if not manex_md_path.is_file():
-                    log.error(
-                        f"Manual example file <{manex_md_path.resolve()}> does not exist."
+                manex_md_path = source_dir / MANEX_DIR / f"{mex}.md"
+                with open(manex_md_path, "r", encoding="utf-8") as f:
+                    output.append(
+                        "LINGDOCS_MANPEXITEM_START"
+                        + mex
+                        + "CONTENT_START"
+                        + f.read()
+                        + "LINGDOCS_MANPEXITEM_END"
                     )
-                    sys.exit(1)
-                else:
-                    with open(manex_md_path, "r", encoding="utf-8") as f:
-                        yield "LINGDOCS_MANEX_START" + url + "CONTENT_START" + f.read() + "LINGDOCS_MANEX_END"  # noqa: E501
-        else:
-            yield md[m.start() : m.end()]
-    yield md[current:]
+        return (
+            "LINGDOCS_MANPEX_START"
+            + url
+            + "CONTENT_START\n"
+            + "\n".join(output)
+            + "\nLINGDOCS_MANPEX_END"
+        )
+    manex_md_path = source_dir / MANEX_DIR / f"{url}.md"
+    if not manex_md_path.is_file():
+        log.error(f"Manual example file <{manex_md_path.resolve()}> does not exist.")
+        sys.exit(1)
+    with open(manex_md_path, "r", encoding="utf-8") as f:
+        return (
+            "LINGDOCS_MANEX_START"
+            + url
+            + "CONTENT_START"
+            + f.read()
+            + "LINGDOCS_MANEX_END"
+        )  # noqa: E501
+
+
+def load_manual_examples(md, source_dir=".", loaded=None):
+    loaded = loaded or {}
+
+    def manual_example(command):
+        if command.url in loaded:
+            return loaded[command.url]
+        return read_manual_example(command.url, source_dir)
+
+    return expand(md, {"manex": manual_example})
 
 
 def process_metadata(tables, dataset, builder):
@@ -296,7 +401,14 @@ def process_metadata(tables, dataset, builder):
     return tables
 
 
-def preprocess(md_str, ds, builder, source_dir):
-    tables = process_metadata(load_table_metadata(source_dir), ds, builder)
-    temp_str = "".join(load_manual_examples(md_str, source_dir))
-    return "".join(load_tables(temp_str, tables, source_dir))
+def preprocess(md_str, source_dir=".", document=None):
+    """Inserts manual examples and tables. If a :class:`lingdocs.document.Document`
+    is passed, its already loaded examples, tables and table metadata are used."""
+    if document is None:
+        table_metadata = load_table_metadata(source_dir)
+        manual_examples, loaded_tables = {}, {}
+    else:
+        table_metadata = document.table_metadata
+        manual_examples, loaded_tables = document.manual_examples, document.tables
+    temp_str = load_manual_examples(md_str, source_dir, manual_examples)
+    return load_tables(temp_str, table_metadata, source_dir, loaded_tables)
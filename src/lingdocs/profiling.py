@@ -0,0 +1,142 @@
+"""Time spent in the stages of a build, for ``lingdocs build --profile``."""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from lingdocs.external import external_calls
+
+log = logging.getLogger(__name__)
+
+
+def _cpu_time():
+    # including finished child processes like pandoc
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class Profiler:
+    """Records wall time, CPU time and calls per format and stage.
+    Times include nested stages, e.g. ``pandoc`` calls made during ``postprocess``.
+    Does nothing unless :attr:`enabled`."""
+
+    def __init__(self):
+        self.enabled = False
+        self.current = "-"
+        self.stages = {}
+        self.counters = {}
+
+    def reset(self, enabled=True):
+        self.enabled = enabled
+        self.current = "-"
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def format(self, name):
+        """Stages in this block are recorded for the output format ``name``."""
+        previous, self.current = self.current, name
+        try:
+            yield
+        finally:
+            self.current = previous
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        wall, cpu = time.perf_counter(), _cpu_time()
+        try:
+            yield
+        finally:
+            self.add(
+                self.current,
+                name,
+                time.perf_counter() - wall,
+                _cpu_time() - cpu,
+            )
+
+    def add(self, output_format, name, wall, cpu, calls=1):
+        stage = self.stages.setdefault(
+            (output_format, name), {"calls": 0, "wall": 0.0, "cpu": 0.0}
+        )
+        stage["calls"] += calls
+        stage["wall"] += wall
+        stage["cpu"] += cpu
+
+    def count(self, name, value):
+        """Record a counter, like cache hits, for the current format."""
+        if self.enabled:
+            self.counters.setdefault(self.current, {})[name] = value
+
+    def report(self):
+        """The stages, counters and the :mod:`external <lingdocs.external>` calls."""
+        return {
+            "stages": [
+                {"format": output_format, "stage": name, **values}
+                for (output_format, name), values in self.stages.items()
+            ],
+            "counters": self.counters,
+            "external": external_calls.report(),
+        }
+
+    def merge(self, report):
+        """Adds a report from a worker process."""
+        for stage in report["stages"]:
+            self.add(
+                stage["format"],
+                stage["stage"],
+                stage["wall"],
+                stage["cpu"],
+                stage["calls"],
+            )
+        for output_format, counters in report["counters"].items():
+            self.counters.setdefault(output_format, {}).update(counters)
+        external_calls.merge(report["external"])
+
+    def summary(self):
+        """The stages as a table, slowest first."""
+        rows = [("format", "stage", "calls", "wall (s)", "cpu (s)")]
+        for (output_format, name), values in sorted(
+            self.stages.items(), key=lambda x: -x[1]["wall"]
+        ):
+            rows.append(
+                (
+                    output_format,
+                    name,
+                    str(values["calls"]),
+                    f"{values['wall']:.3f}",
+                    f"{values['cpu']:.3f}",
+                )
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines = []
+        for i, row in enumerate(rows):
+            lines.append(
+                "  ".join(
+                    cell.ljust(width) if j < 2 else cell.rjust(width)
+                    for j, (cell, width) in enumerate(zip(row, widths))
+                )
+            )
+            if i == 0:
+                lines.append("  ".join("-" * width for width in widths))
+        for output_format, counters in self.counters.items():
+            for name, value in counters.items():
+                lines.append(f"{output_format}: {name} = {value}")
+        for (program, site), values in sorted(
+            external_calls.calls.items(), key=lambda x: -x[1]["wall"]
+        ):
+            lines.append(
+                f"{program} from {site}: {values['calls']} calls, {values['wall']:.3f} s"
+            )
+        return "\n".join(lines)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=4)
+        log.info(f"Wrote build profile to {path}")
+
+
+profiler = Profiler()
@@ -0,0 +1,111 @@
+"""The document structure, i.e. the content files listed in ``docs/structure.yaml``."""
+import logging
+import re
+import sys
+from pathlib import Path
+
+from lingdocs.config import BENCH, CONTENT_FOLDER, STRUCTURE_FILE, config, load_yaml
+
+log = logging.getLogger(__name__)
+
+NUM_PRE = re.compile(r"[\d]+\ ")
+ABC_PRE = re.compile(r"[A-Z]+\ ")
+
+
+def _get_relative_file(folder, file):
+    folder = Path(folder)
+    file = Path(file)
+    if file.name == str(file):
+        return folder / file
+    return file
+
+
+def get_structure(structure_file, prefix_mode=None):
+    counters = {1: 0, 2: 0, 3: 0, 4: 0}
+    files = load_yaml(structure_file) if Path(structure_file).is_file() else None
+    if not files:
+        log.error(
+            f"Please create a {STRUCTURE_FILE} file in your {CONTENT_FOLDER} folder."
+        )
+        sys.exit()
+    contents = {}
+    prefix_choices = ["alpha", "numerical"]
+    for file, values in files.items():
+        contents[file] = values
+        if prefix_mode not in prefix_choices:
+            prefix = ""
+        else:
+            level = values.get("level", 1)
+            i = 4
+            while i > level:
+                counters[i] = 0
+                i -= 1
+            counters[level] += 1
+            numbering = ".".join([str(x) for x in counters.values() if x > 0])
+            if prefix_mode == "numerical":
+                prefix = "".join([str(x) for x in counters.values()]) + " "
+            else:
+                prefix = (
+                    "".join([chr(x + 64) for x in counters.values() if x > 0]) + " "
+                )
+            contents[file]["numbering"] = numbering
+        contents[file]["filename"] = prefix + file + ".md"
+    return contents
+
+
+def update_structure(
+    content_dir=CONTENT_FOLDER,
+    bench_dir=BENCH,
+    structure_file=STRUCTURE_FILE,
+    prefix_mode=config["input"]["content_file_prefix"],
+):
+    log.debug("Updating document structure")
+
+    content_files = {}
+    for file in content_dir.iterdir():
+        if ".md" not in file.name:
+            continue
+        name = re.sub(NUM_PRE, "", file.stem)
+        name = re.sub(ABC_PRE, "", name)
+        content_files[name] = file
+
+    bench_files = {}
+    if Path(bench_dir).is_dir():
+        for file in bench_dir.iterdir():
+            if ".md" not in file.name:
+                continue
+            name = re.sub(NUM_PRE, "", file.stem)
+            name = re.sub(ABC_PRE, "", name)
+            bench_files[name] = file
+
+    structure = get_structure(
+        prefix_mode=prefix_mode,
+        structure_file=_get_relative_file(content_dir, structure_file),
+    )
+
+    for part_id, data in structure.items():
+        new_path = Path(content_dir, data["filename"])
+        if part_id in content_files:
+            if part_id in bench_files:
+                log.warning(f"Conflict: {part_id}. Resolve manually.")
+            else:
+                if content_files[part_id] != new_path:
+                    log.info(f"'{part_id}': {content_files[part_id]} > {new_path}")
+                    content_files[part_id].rename(new_path)
+                del content_files[part_id]
+        elif part_id in bench_files:
+            if bench_files[part_id] != new_path:
+                log.info(f"'{part_id}': moving {bench_files[part_id]} > {new_path}")
+                bench_files[part_id].rename(new_path)
+            del bench_files[part_id]
+        else:
+            log.info(f"'{part_id}': creating file {new_path}")
+            new_path.touch()
+
+    for file in content_files.values():
+        if not bench_dir.is_dir():
+            log.info(f"Creating {bench_dir} for unused files.")
+            bench_dir.mkdir()
+        new_path = Path(bench_dir, file.name)
+        log.info(f"Unlisted: moving {file} > {new_path}")
+        file.rename(new_path)
@@ -1,4 +1,5 @@
 import logging
+import os
 
 from writio import load
 
@@ -97,38 +98,125 @@ def _candidates(base, cbase, m, b):
             yield x
 
 
-def find_template(model, builder, view, rich=config["data"]["rich"]):
+def _scan(path):
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return
+    for entry in entries:
+        # dangling symlinks and files removed since the folder was listed
+        try:
+            is_dir = entry.is_dir()
+            mtime = entry.stat().st_mtime_ns
+        except OSError:
+            continue
+        if is_dir:
+            yield from _scan(entry.path)
+        yield entry.path, mtime
+
+
+def _template_files():
+    files = set()
+    for base in [DATA_DIR / "model_templates", PLD_DIR / "model_templates"]:
+        files.update(path for path, _ in _scan(base))
+    return files
+
+
+class TemplateIndex:
+    """The template files available at a given point in time, and which of them
+    is used for which combination of model, output format and view.
+    Built from a single scan of the template folders, so resolving templates
+    does not need to check the file system.
+
+    Args:
+        version (int): Increases with every new index; template loaders
+            created from an older index are outdated.
+    """
+
+    def __init__(self, version=0):
+        self.version = version
+        self.files = _template_files()
+        self.resolved = {}
+
+    def candidates(self, model, builder, view, rich):
+        """All paths that are tried, in order, and whether they exist."""
+        for r in [rich, not rich]:
+            for b, m, f in _candidates(
+                DATA_DIR / "model_templates",
+                PLD_DIR / "model_templates",
+                model,
+                builder,
+            ):
+                path = _fn(b, m.name, f.name, view, r=r)
+                yield path, str(path) in self.files
+
+    def resolve(self, model, builder, view, rich):
+        key = (model.name, builder.name, view, rich, config["latex"]["interlinear"])
+        if key not in self.resolved:
+            self.resolved[key] = None
+            for path, exists in self.candidates(model, builder, view, rich):
+                if exists:
+                    self.resolved[key] = path
+                    break
+        return self.resolved[key]
+
+
+_index = None
+_index_dir = None
+_index_version = 0
+
+
+def template_index():
+    """The :class:`TemplateIndex` of the template folders, created once per
+    process and project folder; call :func:`invalidate_templates` after
+    templates were added, removed or edited."""
+    global _index, _index_dir, _index_version  # pylint: disable=global-statement
+    # PLD_DIR is relative to the working directory
+    pld_dir = os.path.abspath(PLD_DIR)
+    if _index is None or _index_dir != pld_dir:
+        log.debug("Indexing templates")
+        _index_version += 1
+        _index = TemplateIndex(_index_version)
+        _index_dir = pld_dir
+    return _index
+
+
+def invalidate_templates():
+    """Makes the next lookup scan the template folders again."""
+    global _index  # pylint: disable=global-statement
+    _index = None
+
+
+def find_template(model, builder, view, rich=config["data"]["rich"], index=None):
     """Finds a template for a given model, a given output format, a given view; data-rich or not"""
     log.debug(f"Searching template: {model.name}/{builder.name}_{view}")
-    custom_base = PLD_DIR / "model_templates"
-    base = DATA_DIR / "model_templates"
-
-    # import pandas as pd
-    # cands = []
-    # for b, m, f in _candidates(base, custom_base, model, builder):
-    #     cands.append({"Base": b.parents[0], "Model": m.name, "Format": f.label})
-    # cands = pd.DataFrame(cands)
-    # input(cands.to_string())
-
-    for b, m, f in _candidates(base, custom_base, model, builder):
-        log.debug(f"{b}:{m}/{f}")
-        path = _fn(b, m.name, f.name, view, r=rich)
-        if path.is_file():
-            log.debug(f"Using template {path} for {model.name}/{builder.name}_{view}")
-            return path
-    for b, m, f in _candidates(base, custom_base, model, builder):
-        poor_path = _fn(b, m.name, f.name, view, r=not rich)
-        if poor_path.is_file():
-            log.debug(
-                f"Using template {poor_path} for {model.name}/{builder.name}_{view}"
-            )
-            return poor_path
-    log.warning(
-        f"No template found for {model.name}/{builder.name}_{view} (last tries {path} and {poor_path})"
-    )
+    index = index or template_index()
+    path = index.resolve(model, builder, view, rich)
+    if path:
+        log.debug(f"Using template {path} for {model.name}/{builder.name}_{view}")
+        return path
+    log.warning(f"No template found for {model.name}/{builder.name}_{view}")
     return None
 
 
+def explain_templates(builders, models, rich=False, explain=False):
+    """Lists which template file is used for every model, output format and view.
+    With ``explain``, all candidate paths are listed in the order they are tried."""
+    index = template_index()
+    for builder in builders:
+        for model in models:
+            for view in ["inline", "list", "index", "detail"]:
+                path = index.resolve(model, builder, view, rich)
+                yield f"{model.name}/{builder.name}_{view}: {path}"
+                if explain:
+                    for candidate, exists in index.candidates(
+                        model, builder, view, rich
+                    ):
+                        marker = "*" if candidate == path else " "
+                        marker += "+" if exists else "-"
+                        yield f"    {marker} {candidate}"
+
+
 name_dict = {
     "list": "index",
     "detail": "detail",
@@ -143,15 +231,16 @@ def load_templates(target_builder, models, rich=None):
     # templates = {fn: {"text": {}, "data": {}} for fn in target_builders}
     templates = {"text": {}, "data": {}}
     f = target_builder
+    index = template_index()
     # for fn in target_builders:
     # f = builders[fn]()
     for m in models:
         for view in ["inline", "list"]:
-            res = find_template(m, f, view, rich=rich)
+            res = find_template(m, f, view, rich=rich, index=index)
             if res:
                 templates["text"][f"{m.cldf_table}_{name_dict[view]}.md"] = load(res)
         for view in ["index", "detail"]:
-            res = find_template(m, f, view, rich=rich)
+            res = find_template(m, f, view, rich=rich, index=index)
             if res:
                 templates["data"][f"{m.cldf_table}_{name_dict[view]}.md"] = load(res)
     return templates
@@ -0,0 +1,44 @@
+import pickle
+from pycldf import Dataset
+from lingdocs.cache import BuildCache
+from lingdocs.cache import dataset_fingerprint
+from lingdocs.cache import fingerprint
+from lingdocs.cache import snapshot_dataset
+
+
+def test_fingerprint(dataset):
+    assert fingerprint("a", {"b": 1}) == fingerprint("a", {"b": 1})
+    assert fingerprint("a", {"b": 1}) != fingerprint("a", {"b": 2})
+    assert dataset_fingerprint(dataset) == dataset_fingerprint(dataset)
+
+
+def test_cache(tmp_path):
+    cache = BuildCache(tmp_path / "cache")
+    calls = []
+
+    def render():
+        calls.append(1)
+        return {"rendered": "content"}
+
+    assert cache.memoize("plain", "key", render) == {"rendered": "content"}
+    cache = BuildCache(tmp_path / "cache")
+    assert cache.memoize("plain", "key", render) == {"rendered": "content"}
+    assert len(calls) == 1
+    cache.set("plain", "other", "value")
+    cache = BuildCache(tmp_path / "cache")
+    cache.get("plain", "other")
+    cache.prune("plain")
+    assert cache.get("plain", "key") is None
+    assert cache.get("plain", "other") == "value"
+
+
+def test_snapshot(tmp_path, md_path):
+    rows = list(Dataset.from_metadata(md_path).iter_rows("ExampleTable"))
+    ds = Dataset.from_metadata(md_path)
+    snapshot_dataset(ds, tmp_path)
+    assert list(ds.iter_rows("ExampleTable")) == rows
+    assert len(list(tmp_path.glob("examples.csv-*.pickle"))) == 1
+    ds = pickle.loads(pickle.dumps(ds))
+    snapshot_dataset(ds, tmp_path)
+    assert list(ds.iter_rows("ExampleTable")) == rows
+    assert ds.objects("ExampleTable")[0].id == rows[0]["ID"]
@@ -1,11 +1,15 @@
 import logging
 import shutil
+import subprocess
+import sys
 from pathlib import Path
 from click.testing import CliRunner
 from lingdocs.cli import author_config
 from lingdocs.cli import build
 from lingdocs.cli import check
 from lingdocs.cli import main
+from lingdocs.cli import templates
+from lingdocs.templates import invalidate_templates
 
 
 log = logging.getLogger(__name__)
@@ -41,12 +45,18 @@ def test_cli_build(caplog, tmp_path, md_path, data, monkeypatch):
 def test_cli_check(caplog, tmp_path, md_path, data, monkeypatch):
     runner = CliRunner()
 
-    # add tables
-    shutil.copytree(data / "tables", tmp_path / "tables")
+    # the build cache is written to the output folder
+    source = tmp_path / "project"
+    shutil.copytree(data, source)
     monkeypatch.chdir(tmp_path)
-    result = runner.invoke(check, args=["--cldf", md_path, "--source", data])
+    result = runner.invoke(
+        check,
+        args=["--cldf", md_path, "--source", source, "--output-dir", source / "output"],
+    )
     assert "No missing IDs found." in caplog.text
     assert result.exit_code == 0
+    assert (source / "output" / ".lingdocs-cache").is_dir()
+    assert not (tmp_path / "output").exists()
 
 
 def test_author(tmp_path, monkeypatch, caplog):
@@ -59,3 +69,38 @@ def test_author(tmp_path, monkeypatch, caplog):
     runner.invoke(author_config, catch_exceptions=False)
     assert "Saving to" in caplog.text
     assert (Path.home() / ".config/pld/author_config.yaml").is_file()
+
+
+def test_cli_templates(tmp_path, monkeypatch):
+    runner = CliRunner()
+    monkeypatch.chdir(tmp_path)
+    result = runner.invoke(templates, args=["--targets", "plain"])
+    assert result.exit_code == 0
+    assert "Example/plain_inline: " in result.output
+    custom = tmp_path / "pld" / "model_templates" / "example"
+    custom.mkdir(parents=True)
+    (custom / "plain_inline.md").write_text("custom", encoding="utf-8")
+    invalidate_templates()
+    result = runner.invoke(templates, args=["--targets", "plain", "--explain"])
+    assert "Example/plain_inline: pld/model_templates/example/plain_inline.md" in (
+        result.output
+    )
+    assert "*+ pld/model_templates/example/plain_inline.md" in result.output
+
+
+def test_cli_imports():
+    # a fresh interpreter, since the tests have already imported everything
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, lingdocs.cli; print(' '.join(sorted(sys.modules)))",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    modules = result.stdout.split()
+    for heavy in ["pandas", "pycldf", "cldfviz", "mkdocs", "cookiecutter", "panflute"]:
+        assert heavy not in modules
+    assert "lingdocs.output" not in modules
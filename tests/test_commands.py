@@ -0,0 +1,24 @@
+import pickle
+from lingdocs.commands import Command, Markdown, expand, join, parse, tokenize
+
+
+def test_tokenize():
+    tokens = tokenize("See [ex](apa-1?nt&with_language=False) and [src](x).")
+    assert tokens[0] == "See " and tokens[-1] == "."
+    assert [token.key for token in tokens if isinstance(token, Command)] == [
+        "ex",
+        "src",
+    ]
+    assert tokens[1].arguments == ("apa-1", ["nt"], {"with_language": "False"})
+    assert "".join(tokens) == "See [ex](apa-1?nt&with_language=False) and [src](x)."
+
+
+def test_expand():
+    md = parse("[manex](a) [gl](pl)")
+    res = expand(md, {"manex": lambda cmd: f"<[gl]({cmd.url})>", "ex": str.upper})
+    assert res == "<[gl](a)> [gl](pl)"
+    assert isinstance(res, Markdown)
+    assert [x.url for x in res.tokens if isinstance(x, Command)] == ["a", "pl"]
+    assert expand(res, {"gl": lambda cmd: None}) == res
+    assert join([res, "[gl](x)"], "\n").tokens[-1].url == "x"
+    assert pickle.loads(pickle.dumps(res)).tokens == res.tokens
@@ -0,0 +1,17 @@
+from lingdocs.document import Document
+
+
+def test_document(data):
+    contents = {
+        "examples": {"content": "# Examples {#examples}\n\n[manex](manex1)"},
+        "tables": {"content": "# Tables {#tables}\n\n[table](consonants)"},
+    }
+    document = Document(contents, data)
+    assert document.content.startswith("# Examples")
+    assert len(document.chapters) == 2
+    assert set(document.manual_examples) == {"manex1"}
+    assert set(document.tables) == {"consonants"}
+    assert document.abbrev_dict == {}
+    table_metadata = document.table_metadata_copy()
+    table_metadata["consonants"]["caption"] = "changed"
+    assert document.table_metadata["consonants"]["caption"] != "changed"
@@ -0,0 +1,32 @@
+import sys
+
+import pytest
+
+from lingdocs.external import BudgetExceeded, ExternalCalls, external_calls, run
+
+
+def test_external_calls():
+    calls = ExternalCalls(budget=2)
+    for _ in range(2):
+        with calls.call("pandoc"):
+            pass
+    assert calls.total == 2
+    ((program, site),) = calls.calls
+    assert program == "pandoc"
+    assert site == "-"  # not called from lingdocs
+    assert calls.totals()["pandoc"]["calls"] == 2
+
+    worker = ExternalCalls()
+    worker.add("latexmk", "formats.py:1 (compile)", 1.5)
+    calls.merge(worker.report())
+    assert calls.totals()["latexmk"] == {"calls": 1, "wall": 1.5}
+    with pytest.raises(BudgetExceeded):
+        calls.check()
+
+
+def test_run():
+    external_calls.reset()
+    result = run([sys.executable, "-c", "print('hi')"], program="python")
+    assert result.returncode == 0
+    assert external_calls.totals()["python"]["calls"] == 1
+    external_calls.reset()
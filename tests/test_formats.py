@@ -0,0 +1,23 @@
+from lingdocs.formats import PlainText
+
+
+def test_plain_example_numbering(caplog):
+    content = "\n".join(
+        [
+            "[ex-a] first",
+            "[exref-a] and [exref-b]",
+            "[ex-b] second",
+            "[subex-c] sub",
+            "[ex-a] third, see [exref-c](d) and [exref-x]",
+            "[exref-a]",
+        ]
+    )
+    assert PlainText().postprocess(content).split("\n") == [
+        "(1) first",
+        "(1) and (2)",
+        "(2) second",
+        "(a) sub",
+        "(3) third, see (2a) and [exref-x]",
+        "(3)",
+    ]
+    assert "Could not resolve example reference [exref-x]" in caplog.text
@@ -1,4 +1,7 @@
 from pathlib import Path
+import pandas as pd
+import shutil
+from pycldf import Dataset, Source
 from lingdocs.helpers import _get_relative_file
 from lingdocs.helpers import decorate_gloss_string
 from lingdocs.helpers import load_content
@@ -6,6 +9,17 @@ from lingdocs.helpers import split_ref
 from lingdocs.helpers import src
 from lingdocs.helpers import decorate_gloss_string
 from lingdocs.helpers import write_file
+from lingdocs.helpers import latex_cells
+from lingdocs.helpers import decorate_gloss_word, gloss_cache_stats
+from lingdocs.helpers import upper_gloss_decoration
+from lingdocs.helpers import OutputFiles
+from lingdocs.helpers import latexify_df
+from lingdocs.helpers import overlay_dataset
+from lingdocs.helpers import load_cldf_dataset
+from lingdocs.helpers import check_abbrevs
+from lingdocs.helpers import gloss_candidates
+from lingdocs.config import config
+from lingdocs.pandoc import broker
 from lingdocs.releasing import bump_version
 
 
@@ -53,3 +67,99 @@ def test_gloss_decoration():
     }
     for raw, expex in test_cases.items():
         assert decorate_gloss_string(raw, decoration=lambda x: f"|{x}|") == expex
+
+
+def test_latexify_df():
+    df = pd.DataFrame({"*a*": ["x_y_", "*b*", "1%"], "c": ["*b*", "plain", "*b*"]})
+    content = latexify_df(df).to_latex(escape=False, index=False)
+    assert broker.resolve(content) == (
+        "\\begin{tabular}{ll}\n\\toprule\n\\emph{a} & c \\\\\n\\midrule\n"
+        "x\\_y\\_ & \\emph{b} \\\\\n\\emph{b} & plain \\\\\n1\\% & \\emph{b} \\\\\n"
+        "\\bottomrule\n\\end{tabular}\n"
+    )
+    assert latex_cells["*b*"] == "\\emph{b}"
+
+
+def test_overlay_dataset(tmp_path, data):
+    shutil.copytree(data / "cldf", tmp_path / "cldf")
+    orig = Dataset.from_metadata(tmp_path / "cldf" / "metadata.json")
+    bib = orig.bibpath.read_text(encoding="utf-8")
+    ds = overlay_dataset(orig, mutable=["topics.csv"])
+    assert ds.directory != orig.directory
+    assert len(list(ds.iter_rows("ExampleTable"))) == len(
+        list(orig.iter_rows("ExampleTable"))
+    )
+    ds.add_sources(Source("misc", "new2023", title="New"))
+    ds.add_table("topics.csv", "ID")
+    ds.write(**{"topics.csv": [{"ID": "a"}]})
+    assert orig.bibpath.read_text(encoding="utf-8") == bib
+    assert not (tmp_path / "cldf" / "topics.csv").exists()
+    assert "new2023" in ds.bibpath.read_text(encoding="utf-8")
+
+
+def test_overlay_existing_topics(tmp_path, data, monkeypatch):
+    shutil.copytree(data / "cldf", tmp_path / "cldf")
+    orig = Dataset.from_metadata(tmp_path / "cldf" / "metadata.json")
+    orig.add_table("topics.csv", "ID")
+    orig.write(**{"topics.csv": [{"ID": "a"}]})
+    monkeypatch.setitem(config["input"], "cldf_overlay", True)
+    ds = load_cldf_dataset(
+        tmp_path / "cldf" / "metadata.json", cache_dir=tmp_path / "cache"
+    )
+    assert [row["ID"] for row in ds.iter_rows("topics.csv")] == ["a"]
+    ds.write(**{"topics.csv": [{"ID": "b"}]})
+    assert "b" not in (tmp_path / "cldf" / "topics.csv").read_text(encoding="utf-8")
+
+
+def test_load_cldf_dataset(tmp_path, md_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ds = load_cldf_dataset(md_path, cache_dir=tmp_path / "cache")
+    assert list(ds.iter_rows("ExampleTable"))
+    assert list((tmp_path / "cache" / "cldf").glob("examples.csv-*.pickle"))
+    assert not (tmp_path / "output").exists()
+
+
+def test_gloss_candidates(dataset, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cands = gloss_candidates(dataset, tmp_path / "cache")
+    assert len(cands) == len(set(cands)) > 0
+    assert gloss_candidates(dataset) is cands
+    assert len(list((tmp_path / "cache" / "abbrevs").iterdir())) == 1
+    abbrevs = check_abbrevs(dataset, tmp_path, "[gl](1SG.ABC)")
+    assert abbrevs["1sg-abc"] == "unknown abbreviation"
+    abbrevs = check_abbrevs(dataset, tmp_path, "[gl](1SG~ABC)")
+    assert abbrevs["1sgabc"] == "unknown abbreviation"
+
+
+def test_gloss_cache():
+    decorate_gloss_word.cache_clear()
+    assert decorate_gloss_string("dog-PL dog-PL_DEM") == (
+        "dog-\\gl{pl} dog-\\gl{pl}_\\gl{dem}"
+    )
+    assert gloss_cache_stats() == {"hits": 1, "misses": 2, "size": 2}
+    assert decorate_gloss_string("dog-PL", decoration=upper_gloss_decoration) == (
+        "dog-PL"
+    )
+    assert gloss_cache_stats()["misses"] == 3
+
+
+def test_output_files(tmp_path):
+    files = OutputFiles()
+    files.write("a", tmp_path / "a.md")
+    mtime = (tmp_path / "a.md").stat().st_mtime_ns
+    files.write("a", tmp_path / "a.md")
+    files.write("b", tmp_path / "b.md")
+    (tmp_path / "old.md").write_text("old", encoding="utf-8")
+    (tmp_path / "keep.txt").write_text("other", encoding="utf-8")
+    files.remove_orphans(tmp_path, ["a.md", "b.md"], "*.md")
+    assert (tmp_path / "a.md").stat().st_mtime_ns == mtime
+    assert sorted(x.name for x in tmp_path.iterdir()) == ["a.md", "b.md", "keep.txt"]
+    assert str(files) == "2 written, 1 unchanged, 1 removed"
+    # a file overwritten by another tool, then written with the same content
+    files = OutputFiles()
+    files.remember([tmp_path / "a.md"])
+    (tmp_path / "a.md").write_text("template", encoding="utf-8")
+    files.write("a", tmp_path / "a.md")
+    assert (tmp_path / "a.md").read_text(encoding="utf-8") == "a"
+    assert (tmp_path / "a.md").stat().st_mtime_ns == mtime
+    assert str(files) == "0 written, 1 unchanged, 0 removed"
@@ -0,0 +1,17 @@
+from lingdocs.index import dataset_index
+
+
+def test_index(dataset):
+    index = dataset_index(dataset)
+    assert index is dataset_index(dataset)
+    assert index.ids("morphs.csv")[:2] == ["tri-se-1", "tri-se-2"]
+    assert index.get("LanguageTable", "tri")["Name"] == "Tiriyó"
+    assert index.get("LanguageTable", "xyz") is None
+    assert index.join("morphs.csv", "tri-se-1", "Language_ID")["Name"] == "Tiriyó"
+    assert index.join("ExampleTable", "ekiri-1", "languageReference")["Name"] == (
+        "Ikpeng"
+    )
+    assert "LanguageTable" in index
+    assert "MediaTable" not in index
+    assert index.memo("key", lambda: 1) == 1
+    assert index.memo("key", lambda: 2) == 1
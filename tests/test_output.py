@@ -1,14 +1,20 @@
 import logging
+import os
 import shutil
-from lingdocs.config import CONTENT_FOLDER
+import pytest
+from lingdocs.config import CACHE_DIR, CONTENT_FOLDER, config
 from lingdocs.config import STRUCTURE_FILE
 
 # import pytest
 from lingdocs.helpers import _get_relative_file
 from lingdocs.formats import builders
-from lingdocs.helpers import load_content
+from lingdocs.helpers import load_cldf_dataset, load_content
 from writio import load
-from lingdocs.output import create_output
+from lingdocs.index import dataset_index
+from lingdocs.output import _detail_functions, _watched_files, create_output
+from lingdocs.output import _detail_chunks, find_missing_ids, render_details
+from lingdocs.output import BuildFailed, stream_details
+from lingdocs.preprocessing import _load_templates
 from lingdocs.formats import PlainText
 from lingdocs.postprocessing import postprocess
 from lingdocs.preprocessing import preprocess
@@ -75,3 +81,148 @@ def test_build(data, dataset, caplog, monkeypatch, tmp_path):
         output = load(tmp_path / f"output/{fmt}/{fname}")
         test_output = load(data / f"output/{fname}")
         assert output == test_output
+
+
+def test_watched_files(tmp_path):
+    (tmp_path / CONTENT_FOLDER).mkdir()
+    chapter = tmp_path / CONTENT_FOLDER / "intro.md"
+    chapter.write_text("# Intro", encoding="utf-8")
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / "index.html").write_text("", encoding="utf-8")
+    state = _watched_files(tmp_path)
+    assert str(chapter) in state
+    assert not any("output" in path for path in state)
+    os.utime(chapter, ns=(0, 0))
+    assert _watched_files(tmp_path)[str(chapter)] != state[str(chapter)]
+    # dangling symlinks are skipped
+    (tmp_path / CONTENT_FOLDER / "gone.md").symlink_to(tmp_path / "gone.md")
+    (tmp_path / "gone.yaml").symlink_to(tmp_path / "nowhere.yaml")
+    state = _watched_files(tmp_path)
+    assert str(chapter) in state
+    assert not any("gone" in path for path in state)
+
+
+def test_find_missing_ids(dataset, data):
+    contents = {
+        "intro": {
+            "filename": "intro.md",
+            "content": "[ex](ekiri-1,nope)\n  see [src](abbott1976estrutura[2],nobody2000)\n[manex](manex1)",
+        }
+    }
+    assert list(find_missing_ids(contents, dataset, data)) == [
+        ("intro.md", 1, 14, "ExampleTable", "nope"),
+        ("intro.md", 2, 36, "Source", "nobody2000"),
+    ]
+
+
+def test_render_details(dataset):
+    builder = builders["mkdocs"]()
+    builder.ref_labels = {}
+    _load_templates(builder)
+    _detail_functions(builder, dataset)
+    rids = dataset_index(dataset).ids("LanguageTable")[:6]
+    pages = render_details(builder, dataset, "LanguageTable", "languages", rids)
+    assert len(pages) == 6
+    assert "Apalaí" in pages[rids.index("apa")]
+    chunked = render_details(
+        builder, dataset, "LanguageTable", "languages", rids[:4]
+    ) + render_details(builder, dataset, "LanguageTable", "languages", rids[4:])
+    assert chunked == pages
+
+
+def test_detail_chunks(dataset, monkeypatch):
+    builder = builders["mkdocs"]()
+    builder.ref_labels = {}
+    _load_templates(builder)
+    _detail_functions(builder, dataset)
+    rids = dataset_index(dataset).ids("LanguageTable")[:8]
+    monkeypatch.setitem(config["data"], "chunk_size", 3)
+    monkeypatch.setitem(config["data"], "memory", 0)
+    chunks = [
+        len(chunk)
+        for chunk, _ in _detail_chunks(
+            builder, dataset, "LanguageTable", "languages", rids
+        )
+    ]
+    assert chunks == [3, 3, 2]
+    monkeypatch.setitem(config["data"], "memory", 0.000001)
+    pages = list(stream_details(builder, dataset, "LanguageTable", "languages", rids))
+    assert [rid for rid, _ in pages] == rids
+    chunks = [
+        len(chunk)
+        for chunk, _ in _detail_chunks(
+            builder, dataset, "LanguageTable", "languages", rids
+        )
+    ]
+    assert chunks == [3, 1, 1, 1, 1, 1]
+
+
+def _build(data, dataset, output_dir, formats, jobs):
+    contents = load_content(
+        source_dir=data / CONTENT_FOLDER,
+        structure_file=_get_relative_file(
+            folder=data / CONTENT_FOLDER, file=STRUCTURE_FILE
+        ),
+    )
+    create_output(
+        contents=contents,
+        source_dir=data,
+        output_dir=output_dir,
+        dataset=dataset,
+        formats=formats,
+        metadata=load(data / "metadata.yaml"),
+        jobs=jobs,
+    )
+
+
+def _files(folder):
+    return {
+        str(path.relative_to(folder)): path.read_bytes()
+        for path in folder.rglob("*")
+        if path.is_file() and CACHE_DIR not in path.parts
+    }
+
+
+def test_build_parallel(data, md_path, monkeypatch, tmp_path):
+    shutil.copytree(data, tmp_path / "project")
+    project = tmp_path / "project"
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(config.data, "source", project)
+    monkeypatch.setitem(config["output"], "cache", False)
+    # the dataset reads its tables from snapshots, also in the workers
+    dataset = load_cldf_dataset(md_path, cache_dir=tmp_path / "cache")
+    _build(project, dataset, tmp_path / "sequential", ["plain", "html"], jobs=1)
+    _build(project, dataset, tmp_path / "parallel", ["plain", "html"], jobs=2)
+    sequential = _files(tmp_path / "sequential")
+    assert "html/index.html" in sequential
+    assert _files(tmp_path / "parallel") == sequential
+
+
+def test_build_parallel_failure(data, md_path, monkeypatch, tmp_path, caplog):
+    shutil.copytree(data, tmp_path / "project")
+    project = tmp_path / "project"
+    # a project format replacing html, loaded by the workers
+    (project / "pld").mkdir()
+    (project / "pld" / "formats.py").write_text(
+        """from lingdocs.formats import HTML
+
+class BrokenHTML(HTML):
+    name = "html"
+
+    def preprocess(cls, content):
+        raise ValueError("broken html")
+
+formats = [BrokenHTML]
+""",
+        encoding="utf-8",
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(config.data, "source", project)
+    monkeypatch.setitem(config["output"], "cache", False)
+    dataset = load_cldf_dataset(md_path, cache_dir=tmp_path / "cache")
+    with pytest.raises(BuildFailed, match="1 of 2 formats failed: html"):
+        _build(project, dataset, tmp_path / "output", ["plain", "html"], jobs=2)
+    assert (tmp_path / "output" / "plain" / "document.txt").is_file()
+    # the log of the failed worker is replayed in the parent
+    assert "Building html failed" in caplog.text
+    assert "broken html" in caplog.text
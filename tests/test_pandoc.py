@@ -0,0 +1,32 @@
+from lingdocs.pandoc import PandocBroker, convert_batch, convert_text
+
+
+FRAGMENTS = [
+    "a_b_ *c*",
+    "",
+    "plain text",
+    "two\n\nparagraphs",
+    "<table><tr><td>*x*</td></tr></table>",
+    "# heading",
+    "note[^1]\n\n[^1]: a note",
+]
+
+
+def test_convert_batch():
+    for output_format in ["latex", "html", "plain", "gfm"]:
+        assert convert_batch(FRAGMENTS, output_format) == [
+            convert_text(x, output_format) for x in FRAGMENTS
+        ]
+
+
+def test_broker():
+    broker = PandocBroker()
+    content = " | ".join(
+        [
+            broker.submit("*a*", "latex"),
+            broker.submit("*b*", "html", then=str.upper),
+            broker.submit("c_d_", "latex"),
+        ]
+    )
+    assert broker.resolve(content) == "\\emph{a} | <P><EM>B</EM></P> | c\\_d\\_"
+    assert not broker.pending
@@ -0,0 +1,49 @@
+from importlib.metadata import EntryPoint
+
+import lingdocs.plugins
+from lingdocs.config import config
+from lingdocs.formats import PlainText
+from lingdocs.plugins import Instances, Registry
+
+
+def test_registry(tmp_path, monkeypatch):
+    (tmp_path / "pld").mkdir()
+    (tmp_path / "pld" / "formats.py").write_text(
+        """from lingdocs.formats import PlainText
+
+class Custom(PlainText):
+    name = "custom"
+
+formats = [Custom]
+""",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(
+        lingdocs.plugins,
+        "_entry_points",
+        lambda group: [
+            EntryPoint("installed", "lingdocs.formats:GitHub", "lingdocs.formats")
+        ],
+    )
+    registry = Registry("format", {"plain": PlainText})
+    monkeypatch.setitem(config.data, "source", tmp_path / "other")
+    assert list(registry) == ["plain", "installed"]
+    assert registry["installed"].name == "github"
+
+    monkeypatch.setitem(config.data, "source", tmp_path)
+    assert list(registry) == ["plain", "installed", "custom"]
+    assert issubclass(registry["custom"], PlainText)
+    assert "custom" in registry
+
+
+def test_instances(tmp_path, monkeypatch):
+    registry = Registry("model", {"plain": PlainText})
+    instances = Instances(registry)
+    assert len(instances) == 1
+    assert isinstance(instances[0], PlainText)
+    assert instances[0] is list(instances)[0]
+    assert registry.local() is registry.local()
+    first = instances[0]
+    monkeypatch.setitem(config.data, "source", tmp_path)
+    assert instances[0] is not first
+    assert instances[0] is instances[0]
@@ -1,6 +1,14 @@
 import logging
-from lingdocs.preprocessing import render_markdown
+from jinja2 import DictLoader
+from lingdocs.preprocessing import (
+    _load_templates,
+    get_environment,
+    loaders,
+    render_markdown,
+    resolve_cldf,
+)
 from lingdocs.formats import builders
+from lingdocs.templates import invalidate_templates
 
 log = logging.getLogger(__name__)
 
@@ -29,3 +37,45 @@ def test_mp(dataset):
     }
     for f, s in formats.items():
         assert render_markdown(input_str, dataset, builder=builders[f]) == s
+
+
+def test_resolve_cldf(dataset, caplog):
+    loader = DictLoader(
+        {
+            "LanguageTable_detail.md": "{{ ctx.name }}",
+            "FormTable_detail.md": "[](LanguageTable#cldf:{{ ctx.language.id }})",
+        }
+    )
+    md = "unchanged\n\n[](LanguageTable#cldf:apa)\n\n[](FormTable#cldf:tri-house)"
+    assert resolve_cldf(md, dataset, loader, {}) == "unchanged\n\nApalaí\n\nTiriyó"
+    assert (
+        resolve_cldf(md, dataset, loader, {}, max_depth=1)
+        == "unchanged\n\nApalaí\n\n[](LanguageTable#cldf:tri)"
+    )
+    assert "unresolved after 1 rendering passes" in caplog.text
+    caplog.clear()
+    md = "Links to CLDF objects use `#cldf:` in the URL."
+    assert resolve_cldf(md, dataset, loader, {}) == md
+    assert not caplog.text
+
+
+def test_template_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    builder = builders["plain"]()
+    _load_templates(builder)
+    loader = loaders["plain"]["text"]
+    _load_templates(builder)
+    assert loaders["plain"]["text"] is loader
+    assert get_environment(loader) is get_environment(loader)
+    custom = tmp_path / "pld" / "model_templates" / "language"
+    custom.mkdir(parents=True)
+    (custom / "plain_inline.md").write_text("custom", encoding="utf-8")
+    _load_templates(builder)
+    assert loaders["plain"]["text"] is loader
+    invalidate_templates()
+    _load_templates(builder)
+    assert loaders["plain"]["text"] is not loader
+    assert (
+        loaders["plain"]["text"].get_source(None, "LanguageTable_detail.md")[0]
+        == "custom"
+    )
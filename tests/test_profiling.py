@@ -0,0 +1,45 @@
+import json
+
+from lingdocs.profiling import Profiler
+
+
+def test_profiler(tmp_path):
+    profiler = Profiler()
+    with profiler.stage("load"):
+        pass
+    assert not profiler.stages
+
+    profiler.reset()
+    with profiler.stage("load"):
+        pass
+    with profiler.format("html"):
+        for _ in range(2):
+            with profiler.stage("pandoc"):
+                pass
+        profiler.count("gloss cache hits", 3)
+    assert profiler.stages[("-", "load")]["calls"] == 1
+    assert profiler.stages[("html", "pandoc")]["calls"] == 2
+
+    worker = Profiler()
+    worker.reset()
+    with worker.format("html"):
+        worker.stage("pandoc")(lambda: None)()
+    profiler.merge(worker.report())
+    assert profiler.stages[("html", "pandoc")]["calls"] == 3
+
+    summary = profiler.summary()
+    assert summary.splitlines()[0].split() == [
+        "format",
+        "stage",
+        "calls",
+        "wall",
+        "(s)",
+        "cpu",
+        "(s)",
+    ]
+    assert "html: gloss cache hits = 3" in summary
+
+    profiler.write(tmp_path / "profile.json")
+    report = json.loads((tmp_path / "profile.json").read_text(encoding="utf-8"))
+    assert {x["stage"] for x in report["stages"]} == {"load", "pandoc"}
+    assert report["counters"] == {"html": {"gloss cache hits": 3}}
@@ -1,4 +1,4 @@
-from lingdocs.templates import find_template
+from lingdocs.templates import find_template, invalidate_templates, template_index
 from lingdocs.models import models
 from lingdocs.formats import builders
 
@@ -8,3 +8,13 @@ def test_file_load():
         for m in models:
             for view in ["inline", "list", "index", "detail"]:
                 find_template(m, f(), view)
+
+
+def test_template_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    index = template_index()
+    assert template_index() is index
+    (tmp_path / "pld" / "model_templates").mkdir(parents=True)
+    assert template_index() is index
+    invalidate_templates()
+    assert template_index().version > index.version